@@ -0,0 +1,9 @@
+import pytest
+
+from core.test_runner import temp_cache
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temp_cache_location():
+    with temp_cache():
+        yield
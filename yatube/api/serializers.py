@@ -0,0 +1,72 @@
+"""Поля ресурсов API: имя -> функция от объекта.
+
+Клиент выбирает нужные поля параметром ``?fields=``; функции читают
+только то, что уже загрузили querysets HTML-страниц.
+"""
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _stat(name):
+    # Строки UserStats может не быть, как и в шаблоне профиля: тогда 0.
+    return lambda user: getattr(getattr(user, 'stats', None), name, 0)
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: _isoformat(post.pub_date),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'image_width': lambda post: post.image_width,
+    'image_height': lambda post: post.image_height,
+    'comments_count': lambda post: post.comments_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'parent': lambda comment: comment.parent_id,
+    'depth': lambda comment: comment.depth,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: _isoformat(comment.created),
+}
+
+GROUP_FIELDS = {
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+}
+
+PROFILE_FIELDS = {
+    'username': lambda user: user.username,
+    'full_name': lambda user: user.get_full_name(),
+    'posts_count': _stat('posts_count'),
+    'followers_count': _stat('followers_count'),
+    'following_count': _stat('following_count'),
+    # Вычисляется во view и только если поле запрошено.
+    'following': lambda user: user.viewer_follows,
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def select_fields(available, requested):
+    """Поля из ``?fields=a,b`` или все; неизвестное имя - FieldsError."""
+    if not requested:
+        return available
+    names = [name for name in requested.split(',') if name]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}')
+    return {name: available[name] for name in names}
+
+
+def serialize(obj, fields):
+    return {name: getter(obj) for name, getter in fields.items()}
@@ -0,0 +1,116 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            for i in range(3)
+        ]
+        cls.post = cls.posts[-1]
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, **data):
+        response = self.client.get(url, data)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        content = (
+            b''.join(response.streaming_content) if response.streaming
+            else response.content)
+        return response, json.loads(content)
+
+    @override_settings(NUMBER_OF_POSTS=2)
+    def test_feed_pages_by_cursor(self):
+        response, data = self.get_json(reverse('api:feed'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.posts[2].pk, self.posts[1].pk])
+        self.assertIsNone(data['previous'])
+        _, data = self.get_json(data['next'])
+        self.assertEqual(
+            [post['text'] for post in data['results']], ['Пост 0'])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        _, data = self.get_json(
+            reverse('api:group_posts', kwargs={'slug': 'test'}),
+            fields='id,author')
+        self.assertEqual(
+            data['results'][0], {'id': self.post.pk, 'author': 'auth'})
+        response, data = self.get_json(reverse('api:feed'), fields='secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_objects(self):
+        _, data = self.get_json(
+            reverse('api:post', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(data['group'], 'test')
+        self.assertEqual(data['comments_count'], 1)
+        _, data = self.get_json(
+            reverse('api:post_comments', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        _, data = self.get_json(reverse('api:group', kwargs={'slug': 'test'}))
+        self.assertEqual(data['title'], 'Тестовая группа')
+        response, data = self.get_json(
+            reverse('api:group', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_profile_following_only_when_requested(self):
+        self.client.force_login(self.reader)
+        url = reverse('api:profile', kwargs={'username': 'auth'})
+        _, data = self.get_json(url)
+        self.assertEqual(data['full_name'], 'Лев Толстой')
+        self.assertEqual(data['posts_count'], 3)
+        self.assertTrue(data['following'])
+        with self.assertNumQueries(3):
+            _, data = self.get_json(url, fields='username,followers_count')
+        self.assertEqual(data, {'username': 'auth', 'followers_count': 1})
+
+    def test_profile_without_stats(self):
+        UserStats.objects.filter(user=self.reader).delete()
+        url = reverse('api:profile', kwargs={'username': 'reader'})
+        response, data = self.get_json(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [data['posts_count'], data['followers_count'],
+             data['following_count']],
+            [0, 0, 0])
+
+    def test_follow_feed(self):
+        response, _ = self.get_json(reverse('api:follow_feed'))
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.reader)
+        _, data = self.get_json(reverse('api:follow_feed'))
+        self.assertEqual(len(data['results']), 3)
+
+    def test_not_modified(self):
+        url = reverse('api:profile_posts', kwargs={'username': 'auth'})
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,159 @@
+import functools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts.caching import conditional_view, COMMENTS, FOLLOWS, POSTS
+from posts.feed import pulled_authors, record_feed_path, PULL, PUSH
+from posts.models import Follow, Group, Post, Timeline, User
+from posts.utils import comment_page, paginator, FeedPaginator
+
+from .serializers import (
+    COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS, PROFILE_FIELDS, FieldsError,
+    select_fields, serialize)
+
+
+def error(status, detail):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def api_view(view):
+    """Только GET; 404 и неверный ``?fields=`` отдаются JSON'ом."""
+    @functools.wraps(view)
+    @require_GET
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return error(404, 'Не найдено.')
+        except FieldsError as exc:
+            return error(400, str(exc))
+    return wrapper
+
+
+def _fields(request, available):
+    return select_fields(available, request.GET.get('fields'))
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('page', None)
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def _dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+def _stream(objects, fields, next_url, previous_url):
+    yield '{"results": ['
+    for number, obj in enumerate(objects):
+        if number:
+            yield ', '
+        yield _dumps(serialize(obj, fields))
+    yield (
+        f'], "next": {_dumps(next_url)}, '
+        f'"previous": {_dumps(previous_url)}}}'
+    )
+
+
+def list_response(request, objects, fields, next_cursor, previous_cursor=None):
+    """Страница списка: объекты сериализуются по одному прямо в ответ."""
+    return StreamingHttpResponse(
+        _stream(
+            objects,
+            fields,
+            _page_url(request, next_cursor),
+            _page_url(request, previous_cursor),
+        ),
+        content_type='application/json',
+    )
+
+
+def posts_response(request, post_list, *args, **kwargs):
+    fields = _fields(request, POST_FIELDS)
+    page_obj = paginator(request, post_list, *args, **kwargs)
+    return list_response(
+        request,
+        page_obj.object_list,
+        fields,
+        page_obj.next_cursor,
+        page_obj.previous_cursor,
+    )
+
+
+@conditional_view(POSTS)
+@api_view
+def feed(request):
+    return posts_response(request, Post.objects.for_feed())
+
+
+@conditional_view(POSTS, FOLLOWS)
+@api_view
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return error(401, 'Нужна авторизация.')
+    pulled = pulled_authors(request.user)
+    post_list = Timeline.objects.filter(user=request.user)
+    response = posts_response(
+        request, post_list, FeedPaginator, pulled=pulled)
+    record_feed_path(request, PULL if pulled else PUSH, pulled)
+    return response
+
+
+@conditional_view(POSTS, COMMENTS)
+@api_view
+def post(request, post_id):
+    fields = _fields(request, POST_FIELDS)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    return JsonResponse(serialize(post, fields))
+
+
+@conditional_view(POSTS, COMMENTS)
+@api_view
+def post_comments(request, post_id):
+    fields = _fields(request, COMMENT_FIELDS)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, next_cursor = comment_page(post, request.GET.get('cursor'))
+    return list_response(request, comments, fields, next_cursor)
+
+
+@conditional_view(POSTS)
+@api_view
+def group(request, slug):
+    fields = _fields(request, GROUP_FIELDS)
+    group = get_object_or_404(Group, slug=slug)
+    return JsonResponse(serialize(group, fields))
+
+
+@conditional_view(POSTS)
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return posts_response(request, group.posts.for_feed())
+
+
+@conditional_view(POSTS, FOLLOWS)
+@api_view
+def profile(request, username):
+    fields = _fields(request, PROFILE_FIELDS)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    if 'following' in fields:
+        author.viewer_follows = request.user.is_authenticated and (
+            Follow.objects.filter(user=request.user, author=author).exists())
+    return JsonResponse(serialize(author, fields))
+
+
+@conditional_view(POSTS)
+@api_view
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return posts_response(request, author.posts.for_feed())
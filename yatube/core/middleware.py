@@ -0,0 +1,134 @@
+import functools
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+
+
+class RequestTimings:
+    """Счётчики одного запроса: SQL через execute_wrapper, шаблоны через
+    обёртку ``Template.render``."""
+
+    def __init__(self, slow_queries):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.slow_queries = slow_queries
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db += duration
+            if self.slow_queries:
+                item = (duration, self.queries, sql)
+                if len(self.slowest) < self.slow_queries:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+
+    def metrics(self, total):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db * 1000, 2),
+            'tpl_ms': round(self.template * 1000, 2),
+            'view_ms': round((total - self.template) * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+
+    def server_timing(self, metrics):
+        return ', '.join((
+            f'db;dur={metrics["db_ms"]};desc="{metrics["queries"]} queries"',
+            f'tpl;dur={metrics["tpl_ms"]}',
+            f'view;dur={metrics["view_ms"]}',
+            f'total;dur={metrics["total_ms"]}',
+        ))
+
+
+def instrument_templates():
+    """Оборачивает ``Template.render`` один раз на процесс.
+
+    Вне выборки обёртка стоит одного ``getattr``; вложенные ``include``
+    не считаются повторно.
+    """
+    original = Template.render
+    if getattr(original, 'instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def render(self, context):
+        timings = getattr(_local, 'timings', None)
+        if timings is None or timings.template_depth:
+            return original(self, context)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            timings.template += time.perf_counter() - start
+            timings.template_depth -= 1
+
+    render.instrumented = True
+    Template.render = render
+
+
+class ServerTimingMiddleware:
+    """Отдаёт время SQL, шаблонов и view в заголовке ``Server-Timing``.
+
+    Меряется только доля ``SERVER_TIMING_SAMPLE_RATE`` запросов; для
+    запросов дольше ``SERVER_TIMING_SLOW_MS`` в лог пишутся самые
+    медленные запросы к БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = RequestTimings(settings.SERVER_TIMING_SLOW_QUERIES)
+        _local.timings = timings
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        metrics = timings.metrics(time.perf_counter() - start)
+        response['Server-Timing'] = timings.server_timing(metrics)
+        self.log(request, response, timings, metrics)
+        return response
+
+    def log(self, request, response, timings, metrics):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **metrics,
+        }
+        if metrics['total_ms'] < settings.SERVER_TIMING_SLOW_MS:
+            logger.info(json.dumps(record))
+            return
+        record['slow_queries'] = [
+            {'ms': round(duration * 1000, 2), 'sql': sql}
+            for duration, _, sql in sorted(timings.slowest, reverse=True)
+        ]
+        logger.warning(json.dumps(record))
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, TemporaryFileUploadHandler)
+from django.utils.deconstruct import deconstructible
+
+HASH_NAME = re.compile(r'^(?:.+/)?(?:[0-9a-f]{2}/){2}[0-9a-f]{64}(?:\.\w+)?$')
+
+
+def content_hash(content):
+    """sha256 файла: готовый от загрузчика или по чанкам, без чтения
+    целиком в память."""
+    digest = getattr(content, 'content_hash', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по sha256 содержимого и раскладываются по
+    каталогам ``upload_to/ab/cd/``.
+
+    Одинаковые загрузки ложатся в один файл: повторный ``save`` только
+    возвращает имя уже лежащего файла.
+    """
+
+    def content_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+
+    def is_content_name(self, name):
+        return bool(HASH_NAME.match(name))
+
+    def _save(self, name, content):
+        name = self.content_name(name, content_hash(content))
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+class HashingMixin:
+    """Считает sha256 загружаемого файла по мере прихода чанков и кладёт
+    его в ``content_hash`` готового файла."""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+        HashingMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,33 @@
+"""Запуск тестов с кэшем во временном каталоге."""
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temp_cache():
+    """Кладёт файл кэша во временный каталог: тесты пишут в кэш и не
+    должны трогать рабочий cache.sqlite3."""
+    with tempfile.TemporaryDirectory(prefix='yatube-cache-') as path:
+        default = dict(
+            settings.CACHES['default'],
+            LOCATION=os.path.join(path, 'cache.sqlite3'),
+        )
+        with override_settings(
+                CACHES={**settings.CACHES, 'default': default}):
+            yield
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._stack = ExitStack()
+        self._stack.enter_context(temp_cache())
+
+    def teardown_test_environment(self, **kwargs):
+        self._stack.close()
+        super().teardown_test_environment(**kwargs)
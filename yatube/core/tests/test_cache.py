@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+from core.cache import SQLiteCache
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_INTERVAL': 1,
+                        'LRU_RESOLUTION': 0},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_many(self):
+        self.cache.set_many({'a': 1, 'b': {'text': 'два'}})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']),
+            {'a': 1, 'b': {'text': 'два'}})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('c', 3))
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_ttl(self):
+        self.cache.set('short', 'value', timeout=1)
+        self.cache.set('gone', 'value', timeout=0)
+        self.assertEqual(self.cache.get('short'), 'value')
+        self.assertIsNone(self.cache.get('gone'))
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('short'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('short')
+
+    def test_lru_eviction(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+            time.sleep(0.01)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'a')
+
+    def test_incr_is_shared_and_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.url_profile = reverse(
+            'posts:profile', kwargs={'username': 'auth'})
+
+    def test_server_timing_header(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get(self.url_profile)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'queries"', 'tpl;dur=', 'view;dur=',
+                       'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        self.assertIn('"queries":', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0)
+    def test_slow_request_logs_queries(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(self.url_profile)
+        self.assertIn('"slow_queries"', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        response = self.client.get(self.url_profile)
+        self.assertFalse(response.has_header('Server-Timing'))
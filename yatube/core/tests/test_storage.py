@@ -0,0 +1,38 @@
+import hashlib
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_name_is_sharded_content_hash(self):
+        digest = hashlib.sha256(b'content').hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(b'content'))
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertTrue(self.storage.is_content_name(name))
+        self.assertFalse(self.storage.is_content_name('posts/photo.jpg'))
+
+    def test_identical_uploads_share_file(self):
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_uses_hash_from_upload_handler(self):
+        content = ContentFile(b'content')
+        content.content_hash = 'ab' * 32
+        name = self.storage.save('posts/a.gif', content)
+        self.assertEqual(name, f'posts/ab/ab/{"ab" * 32}.gif')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group, Comment
+from .search import match_query, matching_posts
 from django.conf import settings
 
 
@@ -11,6 +12,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = settings.EMPTY_VALUE
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице - индекс FTS5.
+        if not search_term.strip():
+            return queryset, False
+        if not match_query(search_term):
+            # Ни одного слова (например, "!!!"): MATCH '' - ошибка FTS5.
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching_posts(search_term)), False
+
 
 admin.site.register(Group)
 admin.site.register(Comment)
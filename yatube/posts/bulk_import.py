@@ -0,0 +1,401 @@
+"""Пакетный импорт исторических данных для команды ``import_data``.
+
+Строки читаются потоком и вставляются ``bulk_create`` пачками, каждая
+в своей транзакции. Сигналы при этом не срабатывают: счётчики
+затронутых строк пересчитываются в той же транзакции, ленты подписок и
+поколения кэша команда восстанавливает в конце.
+"""
+import csv
+import json
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .counters import rebuild_comment_counts, rebuild_user_stats
+from .feed import backfill_author
+from .images import fill_image_metadata
+from .models import (
+    COMMENT_MAX_DEPTH, PATH_STEP, Comment, Follow, Group, Post, path_key)
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+
+def read_rows(file, format_):
+    """Словари строк файла по одной."""
+    if format_ == CSV:
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_date(value):
+    """ISO-дата из файла; без зоны считается в TIME_ZONE, пустая - сейчас."""
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def historical_dates(model):
+    """Отключает auto_now_add: bulk_create иначе перезапишет даты из
+    файла текущим временем."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def deferred_indexes(model):
+    """Удаляет индексы из ``Meta.indexes`` на время импорта и строит их
+    заново в конце: одна сортировка вместо вставки в B-дерево на каждую
+    строку. Нельзя вызывать внутри транзакции."""
+    indexes = model._meta.indexes
+    with connection.schema_editor() as editor:
+        for index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(model, index)
+
+
+class Lookup:
+    """Ключ из файла -> pk. Недостающие ключи пачки догружаются одним
+    запросом; в памяти только уже встреченные ключи."""
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.pks = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self.pks}
+        if missing:
+            self.pks.update(
+                self.queryset
+                .filter(**{f'{self.field}__in': missing})
+                .values_list(self.field, 'pk')
+            )
+
+    def get(self, key):
+        return self.pks.get(key)
+
+
+class Importer:
+    """Вставка строк одного вида. ``build`` превращает пачку словарей в
+    объекты, пропуская строки с неразрешёнными ссылками."""
+
+    model = None
+    # Уникальные ключи модели: строки с уже занятым ключом не вставляются
+    # и считаются пропущенными как conflict.
+    keys = (('pk',),)
+
+    def __init__(self):
+        self.skipped = Counter()
+        # Авторы, чьи посты или подписчики изменились: им нужна лента.
+        self.authors = set()
+        self.next_pk = (
+            self.model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def allocate(self, row):
+        """pk строки: из поля id или следующий свободный. Явные id делают
+        повторный импорт того же файла безопасным."""
+        if row.get('id'):
+            pk = int(row['id'])
+            self.next_pk = max(self.next_pk, pk + 1)
+        else:
+            pk = self.next_pk
+            self.next_pk += 1
+        return pk
+
+    def skip(self, reason):
+        self.skipped[reason] += 1
+
+    def build(self, rows):
+        raise NotImplementedError
+
+    def without_conflicts(self, objs):
+        """Отбрасывает объекты, чей ключ уже есть в базе или раньше в
+        пачке: ``bulk_create(ignore_conflicts=True)`` пропустил бы их
+        молча, и счёт вставленных строк был бы неверным."""
+        for fields in self.keys:
+            lookups = {
+                f'{field}__in': {getattr(obj, field) for obj in objs}
+                for field in fields
+            }
+            taken = set(
+                self.model.objects.filter(**lookups).values_list(*fields))
+            kept = []
+            for obj in objs:
+                key = tuple(getattr(obj, field) for field in fields)
+                if key in taken:
+                    self.skip('conflict')
+                else:
+                    taken.add(key)
+                    kept.append(obj)
+            objs = kept
+        return objs
+
+    def prepare(self, objs):
+        """Дополняет объекты перед вставкой."""
+
+    def recount(self, objs):
+        """Пересчитывает счётчики, затронутые вставленными объектами:
+        сигналы ``bulk_create`` не вызывает."""
+
+    def import_batch(self, rows):
+        """Вставляет пачку и возвращает число действительно вставленных
+        строк."""
+        with transaction.atomic():
+            objs = self.without_conflicts(self.build(rows))
+            self.prepare(objs)
+            with historical_dates(self.model):
+                # ignore_conflicts - только от гонки с другими записями.
+                self.model.objects.bulk_create(objs, ignore_conflicts=True)
+            self.recount(objs)
+        return len(objs)
+
+    def finish(self):
+        # Явные pk не двигают последовательности PostgreSQL.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [self.model])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+class UserImporter(Importer):
+    model = User
+    keys = (('pk',), ('username',))
+
+    def build(self, rows):
+        return [
+            User(
+                pk=self.allocate(row),
+                username=row['username'],
+                first_name=row.get('first_name') or '',
+                last_name=row.get('last_name') or '',
+                email=row.get('email') or '',
+                # Пароль переносится только готовым хэшем.
+                password=row.get('password') or make_password(None),
+                date_joined=parse_date(row.get('date_joined')),
+            )
+            for row in rows
+        ]
+
+    def recount(self, objs):
+        rebuild_user_stats([user.pk for user in objs])
+
+
+class GroupImporter(Importer):
+    model = Group
+    keys = (('pk',), ('slug',))
+
+    def build(self, rows):
+        return [
+            Group(
+                pk=self.allocate(row),
+                slug=row['slug'],
+                title=row['title'],
+                description=row.get('description') or '',
+            )
+            for row in rows
+        ]
+
+
+class PostImporter(Importer):
+    model = Post
+
+    def __init__(self):
+        super().__init__()
+        self.users = Lookup(User.objects.all(), 'username')
+        self.groups = Lookup(Group.objects.all(), 'slug')
+
+    def build(self, rows):
+        self.users.load(row['author'] for row in rows)
+        self.groups.load(row.get('group') for row in rows)
+        posts = []
+        for row in rows:
+            author_id = self.users.get(row['author'])
+            group_id = self.groups.get(row.get('group'))
+            if author_id is None:
+                self.skip('author')
+            elif row.get('group') and group_id is None:
+                self.skip('group')
+            else:
+                self.authors.add(author_id)
+                posts.append(Post(
+                    pk=self.allocate(row),
+                    text=row['text'],
+                    author_id=author_id,
+                    group_id=group_id,
+                    pub_date=parse_date(row.get('pub_date')),
+                    image=row.get('image') or '',
+                ))
+        return posts
+
+    def prepare(self, posts):
+        for post in posts:
+            if not post.image:
+                continue
+            try:
+                with post.image.open('rb') as file:
+                    fill_image_metadata(post, file)
+            except (OSError, ValueError) as error:
+                # Пост импортируется и без размеров и превью: их дозаполнит
+                # backfill_image_metadata, когда файл появится.
+                logger.warning('%s: %s', post.image.name, error)
+
+    def recount(self, posts):
+        rebuild_user_stats({post.author_id for post in posts})
+
+
+class FollowImporter(Importer):
+    model = Follow
+    keys = (('user_id', 'author_id'),)
+
+    def __init__(self):
+        super().__init__()
+        self.users = Lookup(User.objects.all(), 'username')
+
+    def build(self, rows):
+        self.users.load(
+            name for row in rows for name in (row['user'], row['author']))
+        follows = []
+        for row in rows:
+            user_id = self.users.get(row['user'])
+            author_id = self.users.get(row['author'])
+            if user_id is None or author_id is None:
+                self.skip('user')
+            elif user_id == author_id:
+                self.skip('self')
+            else:
+                self.authors.add(author_id)
+                follows.append(Follow(user_id=user_id, author_id=author_id))
+        return follows
+
+    def recount(self, follows):
+        rebuild_user_stats(
+            {follow.user_id for follow in follows}
+            | {follow.author_id for follow in follows})
+
+
+class CommentImporter(Importer):
+    """Ответ должен идти в файле после своего комментария: путь ответа
+    строится из пути родителя."""
+
+    model = Comment
+
+    def __init__(self):
+        super().__init__()
+        self.users = Lookup(User.objects.all(), 'username')
+
+    def parent_paths(self, rows):
+        ids = {int(row['parent']) for row in rows if row.get('parent')}
+        return dict(
+            Comment.objects.filter(pk__in=ids).values_list('pk', 'path'))
+
+    def thread(self, parent_id, paths):
+        """(parent_id, префикс пути) с тем же ограничением глубины, что
+        и ``Comment.save``."""
+        if not parent_id:
+            return None, ''
+        path = paths[parent_id]
+        if len(path) // PATH_STEP - 1 >= COMMENT_MAX_DEPTH:
+            path = path[:-PATH_STEP]
+            parent_id = int(path[-PATH_STEP:], 36)
+        return parent_id, path
+
+    def build(self, rows):
+        self.users.load(row['author'] for row in rows)
+        posts = set(Post.objects.filter(
+            pk__in={int(row['post']) for row in rows}
+        ).values_list('pk', flat=True))
+        paths = self.parent_paths(rows)
+        comments = []
+        for row in rows:
+            author_id = self.users.get(row['author'])
+            parent_id = int(row['parent']) if row.get('parent') else None
+            if author_id is None:
+                self.skip('author')
+            elif int(row['post']) not in posts:
+                self.skip('post')
+            elif parent_id and parent_id not in paths:
+                self.skip('parent')
+            else:
+                comment = self.build_comment(row, author_id, parent_id, paths)
+                paths[comment.pk] = comment.path
+                comments.append(comment)
+        return comments
+
+    def build_comment(self, row, author_id, parent_id, paths):
+        pk = self.allocate(row)
+        parent_id, prefix = self.thread(parent_id, paths)
+        return Comment(
+            pk=pk,
+            post_id=int(row['post']),
+            author_id=author_id,
+            parent_id=parent_id,
+            text=row['text'],
+            created=parse_date(row.get('created')),
+            path=prefix + path_key(pk),
+        )
+
+    def recount(self, comments):
+        rebuild_comment_counts({comment.post_id for comment in comments})
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'groups': GroupImporter,
+    'posts': PostImporter,
+    'follows': FollowImporter,
+    'comments': CommentImporter,
+}
+
+
+def push_to_timeline(author_ids):
+    """Раскладывает посты авторов по лентам подписчиков, как сигналы
+    ``push_post_to_followers`` и ``backfill_timeline``."""
+    for author_id in author_ids:
+        backfill_author(author_id)
@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import logging
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+logger = logging.getLogger(__name__)
+
+POSTS = 'posts'
+COMMENTS = 'comments'
+FOLLOWS = 'follows'
+
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+RECOMPUTE = 'recompute'
+VIEW_CACHE_EVENTS = (HIT, MISS, STALE, RECOMPUTE)
+
+
+def incr_counter(key):
+    # Обычно ключ уже есть: одна запись в кэш на событие, add - только
+    # для первого.
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def _generation_key(namespace):
+    return f'generation:{namespace}'
+
+
+def _changed_key(namespace):
+    return f'changed:{namespace}'
+
+
+def _initial_generation():
+    # Если ключ вытеснят из кэша, новое поколение всё равно будет больше
+    # любого прежнего, и старые страницы не станут свежими.
+    return time.time_ns()
+
+
+def get_generation(namespace):
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        cache.add(_changed_key(namespace), time.time(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(namespace):
+    key = _generation_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_generation(), timeout=None)
+    cache.set(_changed_key(namespace), time.time(), timeout=None)
+
+
+def view_cache_stats(namespace):
+    return {
+        event: cache.get(f'view_cache:{namespace}:{event}', 0)
+        for event in VIEW_CACHE_EVENTS
+    }
+
+
+def _page_key(view, request):
+    user_id = request.user.pk or 0
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'view:{view.__module__}.{view.__name__}:{user_id}:{path}'
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def _wait_for_entry(key, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    logger.warning('view cache lock expired for %s', key)
+    return None
+
+
+def _recompute(view, request, args, kwargs, key, generation, timeout):
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        if _cacheable(response):
+            cache.set(
+                key,
+                (generation, time.time() + timeout, response),
+                timeout + settings.VIEW_CACHE_STALE_TIMEOUT,
+            )
+    finally:
+        cache.delete(f'{key}:lock')
+    return response
+
+
+def cache_view(timeout, namespace):
+    """Кэш страницы со сбросом по поколению ``namespace`` и защитой от
+    stampede.
+
+    Страница свежа ``timeout`` секунд и пока не сменилось поколение.
+    Устаревшую страницу пересчитывает только процесс, взявший блокировку;
+    остальные ещё ``VIEW_CACHE_STALE_TIMEOUT`` секунд получают старую
+    версию. При полном промахе конкуренты ждут первого пересчёта не
+    дольше ``VIEW_CACHE_LOCK_TIMEOUT``.
+    """
+    def count(event):
+        incr_counter(f'view_cache:{namespace}:{event}')
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = _page_key(view, request)
+            generation = get_generation(namespace)
+            entry = cache.get(key)
+            if entry is None:
+                count(MISS)
+            elif entry[0] == generation and time.time() < entry[1]:
+                count(HIT)
+                return entry[2]
+            lock_timeout = settings.VIEW_CACHE_LOCK_TIMEOUT
+            if not cache.add(f'{key}:lock', 1, lock_timeout):
+                if entry is not None:
+                    count(STALE)
+                    # ETag посчитан по новому поколению: старую страницу
+                    # нельзя сохранять, иначе её подтвердит 304.
+                    patch_cache_control(entry[2], no_store=True)
+                    return entry[2]
+                entry = _wait_for_entry(key, lock_timeout)
+                if entry is not None:
+                    return entry[2]
+            count(RECOMPUTE)
+            return _recompute(
+                view, request, args, kwargs, key, generation, timeout)
+        return wrapper
+    return decorator
+
+
+def conditional_view(*namespaces):
+    """ETag и Last-Modified по поколениям ``namespaces``.
+
+    Валидаторы берутся только из кэша: при совпадении If-None-Match или
+    If-Modified-Since ответ 304 отдаётся без запросов к постам. ETag
+    учитывает пользователя и полный путь - страница для каждого своя.
+    Ставится над ``cache_view``.
+    """
+    def etag(request, *args, **kwargs):
+        generations = ':'.join(
+            str(get_generation(namespace)) for namespace in namespaces)
+        key = f'{generations}:{request.user.pk or 0}:{request.get_full_path()}'
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        changed = cache.get_many(
+            [_changed_key(namespace) for namespace in namespaces])
+        if not changed:
+            return None
+        return datetime.fromtimestamp(max(changed.values()), timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
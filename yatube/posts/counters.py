@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+STATS_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def bump_user(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    # Отсутствующую строку создаём только при росте счётчика: при удалении
+    # пользователя каскадом его строка уже может быть удалена.
+    if not updated and delta > 0:
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id, **{field: delta})],
+            ignore_conflicts=True,
+        )
+
+
+def count_of(model, field):
+    """Подзапрос: сколько строк ``model`` ссылается на текущую по ``field``."""
+    rows = (
+        model.objects
+        .filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def rebuild_user_stats(pks):
+    """Пересчитывает ``UserStats`` пользователей ``pks`` с нуля."""
+    rows = User.objects.filter(pk__in=pks).annotate(
+        posts_total=count_of(Post, 'author'),
+        followers_total=count_of(Follow, 'author'),
+        following_total=count_of(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    stats = [
+        UserStats(
+            user_id=pk,
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        )
+        for pk, posts, followers, following in rows
+    ]
+    with transaction.atomic():
+        existing = set(UserStats.objects.filter(
+            user_id__in=pks).values_list('user_id', flat=True))
+        UserStats.objects.bulk_create(
+            [row for row in stats if row.user_id not in existing])
+        UserStats.objects.bulk_update(
+            [row for row in stats if row.user_id in existing],
+            STATS_FIELDS,
+        )
+
+
+def rebuild_comment_counts(pks):
+    Post.objects.filter(pk__in=pks).update(
+        comments_count=count_of(Comment, 'post'))
@@ -0,0 +1,112 @@
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import incr_counter
+from .models import Follow, Post, Timeline, TimelineBackfill, UserStats
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+PUSH = 'push'
+PULL = 'pull'
+FEED_PATHS = (PUSH, PULL)
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def is_pushed(author_id):
+    """Раскладываются ли посты автора по лентам подписчиков при записи."""
+    return followers_count(author_id) < settings.TIMELINE_PUSH_LIMIT
+
+
+def fill_timeline(entries):
+    """Вставляет записи ленты пачками, не держа их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_author(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков.
+
+    Нужна, когда автор снова становится push: пока он был pull, его
+    новые посты и новые подписки в ``Timeline`` не попадали. Уже
+    лежащие записи пропускаются.
+    """
+    if not is_pushed(author_id):
+        return
+    # Подписчиков меньше TIMELINE_PUSH_LIMIT, посты идут потоком.
+    followers = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    fill_timeline(
+        Timeline(
+            user_id=user_id,
+            author_id=author_id,
+            post_id=post_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+        for user_id in followers
+    )
+
+
+def queue_backfill(author_id):
+    """Ставит досыпку лент автора в очередь ``backfill_timelines``.
+
+    Досыпка - O(подписчики * посты), в запросе отписки ей не место.
+    """
+    # Автор мог быть удалён вместе со своими подписками.
+    if User.objects.filter(pk=author_id).exists():
+        TimelineBackfill.objects.update_or_create(
+            author_id=author_id, defaults={'requested': timezone.now()})
+
+
+def process_backfills(limit):
+    """Досыпает ленты до ``limit`` авторов из очереди и возвращает их
+    число."""
+    queued = list(TimelineBackfill.objects.order_by('requested')[:limit])
+    for entry in queued:
+        backfill_author(entry.author_id)
+        # Отписка во время досыпки сдвинула requested: строка остаётся
+        # до следующего прохода.
+        TimelineBackfill.objects.filter(
+            pk=entry.pk, requested=entry.requested).delete()
+    return len(queued)
+
+
+def pulled_authors(user):
+    """Авторы из подписок ``user``, чьи посты подмешиваются при чтении."""
+    return list(
+        Follow.objects
+        .filter(
+            user=user,
+            author__stats__followers_count__gte=settings.TIMELINE_PUSH_LIMIT
+        )
+        .values_list('author_id', flat=True)
+    )
+
+
+def record_feed_path(request, path, pulled):
+    incr_counter(f'feed_path:{path}')
+    logger.info(
+        'follow feed: user=%s path=%s pulled_authors=%s',
+        request.user.pk, path, len(pulled)
+    )
+
+
+def feed_path_stats():
+    return {path: cache.get(f'feed_path:{path}', 0) for path in FEED_PATHS}
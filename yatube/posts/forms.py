@@ -1,4 +1,5 @@
-from django.forms import ModelForm
+from django.forms import HiddenInput, ModelForm
+from .images import fill_image_metadata
 from .models import Post, Comment
 
 
@@ -15,8 +16,30 @@ class PostForm(ModelForm):
             'group': 'Группа поста'
         }
 
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        if 'image' in self.changed_data:
+            fill_image_metadata(post, self.cleaned_data['image'])
+        if commit:
+            post.save()
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ReplyForm(CommentForm):
+    """Комментарий или ответ: ``parent`` приходит скрытым полем."""
+
+    class Meta(CommentForm.Meta):
+        fields = ('text', 'parent')
+        widgets = {'parent': HiddenInput}
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Отвечать можно только на комментарии того же поста.
+        if post is not None:
+            self.fields['parent'].queryset = post.comments.all()
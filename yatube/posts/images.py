@@ -0,0 +1,67 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, features
+
+PREVIEW_SIZE = (16, 16)
+PREVIEW_QUALITY = 50
+
+FALLBACK_FORMAT = 'JPEG'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+# Форматы, для которых Pillow нужен отдельно собранный модуль.
+CODEC_MODULES = {'WEBP': 'webp', 'AVIF': 'avif'}
+
+
+def supported_formats():
+    """Форматы из ``POST_IMAGE_FORMATS``, которые умеет сохранять Pillow.
+
+    Смотрит только на модули кодеков, не загружая все плагины Pillow.
+    """
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ not in CODEC_MODULES
+        or (CODEC_MODULES[format_] in features.modules
+            and features.check_module(CODEC_MODULES[format_]))
+    ]
+
+
+def encoder_options(format_):
+    """Параметры ``Image.save`` для формата: качество и усилие кодека."""
+    return dict(settings.POST_IMAGE_FORMATS.get(format_, {}))
+
+
+def make_preview(image):
+    """Крошечный JPEG в data URI: размытая заглушка до загрузки картинки."""
+    image.draft('RGB', PREVIEW_SIZE)
+    preview = image.convert('RGB')
+    preview.thumbnail(PREVIEW_SIZE)
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=PREVIEW_QUALITY)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+def fill_image_metadata(post, file):
+    """Записывает в пост размеры, вес и превью картинки из ``file``.
+
+    Без файла поля очищаются. Позиция в файле восстанавливается, чтобы
+    его можно было сохранить в хранилище.
+    """
+    if not file:
+        post.image_width = post.image_height = post.image_size = None
+        post.image_preview = ''
+        return
+    position = file.tell()
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            post.image_width, post.image_height = image.size
+            post.image_preview = make_preview(image)
+    finally:
+        file.seek(position)
+    post.image_size = file.size
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import fill_image_metadata
+from posts.models import Post
+from posts.thumbnails import forget_cards
+from posts.utils import pk_batches
+
+METADATA_FIELDS = (
+    'image_width', 'image_height', 'image_size', 'image_preview')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, вес и превью картинок у постов, загруженных '
+        'до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(image_width=None)
+        filled = failed = 0
+        for pks in pk_batches(posts, options['batch_size']):
+            batch = []
+            for post in Post.objects.for_feed().filter(pk__in=pks):
+                try:
+                    with post.image.open('rb') as file:
+                        fill_image_metadata(post, file)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                batch.append(post)
+            Post.objects.bulk_update(batch, METADATA_FIELDS)
+            forget_cards(batch)
+            filled += len(batch)
+            self.stdout.write(f'Заполнено {filled}, ошибок {failed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: заполнено {filled}, ошибок {failed}'))
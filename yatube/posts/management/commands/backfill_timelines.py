@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.feed import process_backfills
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди досыпки лент: раскладывает посты авторов, снова '
+        'ставших push, по лентам их подписчиков. С --once разбирает '
+        'очередь и завершается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument('--once', action='store_true')
+
+    def handle(self, *args, **options):
+        while True:
+            done = process_backfills(options['batch_size'])
+            if done:
+                self.stdout.write(f'Досыпано лент авторов: {done}')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll'])
@@ -0,0 +1,66 @@
+import inspect
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from posts.models import Group, Post
+from posts.views import group_posts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и пиковую память страницы группы при росте '
+        'группы. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"posts":>10} {"median, ms":>12} {"peak, KiB":>12}')
+        with transaction.atomic():
+            author = User.objects.create(username='bench_group_page')
+            group = Group.objects.create(
+                title='bench', slug='bench-group-page', description='')
+            created = 0
+            for size in sorted(options['sizes']):
+                Post.objects.bulk_create(
+                    (
+                        Post(text=f'Пост {i}', author=author, group=group)
+                        for i in range(created, size)
+                    )
+                )
+                created = size
+                timings, peak = self.measure(group.slug, options['repeat'])
+                self.stdout.write(
+                    f'{size:>10} {statistics.median(timings):>12.2f} '
+                    f'{peak / 1024:>12.1f}'
+                )
+            transaction.set_rollback(True)
+
+    def measure(self, slug, repeat):
+        # Без conditional_view и cache_view: меряется сам запрос и рендер
+        # страницы.
+        view = inspect.unwrap(group_posts)
+        request = RequestFactory().get(f'/group/{slug}/')
+        request.user = AnonymousUser()
+        timings = []
+        tracemalloc.start()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            view(request, slug=slug)
+            timings.append((time.perf_counter() - start) * 1000)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return timings, peak
@@ -0,0 +1,58 @@
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageFilter, ImageOps
+
+from posts.images import FALLBACK_FORMAT, encoder_options, supported_formats
+from posts.thumbnails import CARD_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время кодирования и размер миниатюр по форматам и '
+        'ширинам из POST_IMAGE_FORMATS и POST_IMAGE_WIDTHS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            help='Исходная картинка; по умолчанию - синтетическое фото.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        source = self.load(options['image'])
+        self.stdout.write(
+            f'{"format":>6} {"width":>6} {"median, ms":>11} '
+            f'{"KiB":>8} {"vs JPEG":>8}')
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * CARD_SIZE[1] / CARD_SIZE[0])
+            image = ImageOps.fit(source, (width, height), Image.LANCZOS)
+            results = {
+                format_: self.measure(image, format_, options['repeat'])
+                for format_ in supported_formats()
+            }
+            baseline = results[FALLBACK_FORMAT][1]
+            for format_, (timing, size) in results.items():
+                self.stdout.write(
+                    f'{format_:>6} {width:>6} {timing:>11.2f} '
+                    f'{size / 1024:>8.1f} {size / baseline - 1:>+8.0%}')
+
+    def load(self, path):
+        if path:
+            with Image.open(path) as image:
+                return image.convert('RGB')
+        # Шум с размытием ближе к фотографии, чем гладкий градиент.
+        return Image.effect_noise((1600, 1200), 64).convert('RGB').filter(
+            ImageFilter.GaussianBlur(2))
+
+    def measure(self, image, format_, repeat):
+        timings = []
+        for _ in range(repeat):
+            buffer = BytesIO()
+            start = time.perf_counter()
+            image.save(buffer, format_, **encoder_options(format_))
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), buffer.tell()
@@ -0,0 +1,37 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время рендера и размер paginator.html при росте числа '
+        'страниц. Открывается средняя страница - худший случай окна.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, nargs='+',
+            default=[10, 1000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        template = get_template('posts/includes/paginator.html')
+        self.stdout.write(
+            f'{"pages":>10} {"median, ms":>12} {"bytes":>8}')
+        for pages in options['pages']:
+            # range не хранит элементы: count и срез страницы - O(1).
+            paginator = Paginator(range(pages * 10), 10)
+            context = {'page_obj': paginator.page(pages // 2 + 1)}
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                html = template.render(context)
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{pages:>10} {statistics.median(timings):>12.3f} '
+                f'{len(html.encode()):>8}'
+            )
@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Comment, Post
+from posts.search import search
+
+User = get_user_model()
+
+VOCABULARY = 5000
+WORDS_PER_POST = 12
+# Слова по частоте: первое встречается почти в каждом посте, последнее -
+# в единицах.
+QUERIES = ('слово0', 'слово50', 'слово4000', 'слово0 слово50')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время страницы поиска при росте числа постов: первую '
+        'страницу и следующую по курсору. На каждый пост приходится '
+        'комментарий, частоты слов распределены по Ципфу. Данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        words = [f'слово{i}' for i in range(VOCABULARY)]
+        weights = [1 / (i + 1) for i in range(VOCABULARY)]
+        rng = random.Random(0)
+        self.stdout.write(
+            f'{"posts":>10} {"query":>16} {"first, ms":>10} '
+            f'{"next, ms":>10}')
+        with transaction.atomic():
+            author = User.objects.create(username='bench_search')
+            post = Post.objects.create(text='bench_search', author=author)
+            created = 0
+            for size in sorted(options['sizes']):
+                count = size - created
+                Post.objects.bulk_create(
+                    Post(text=self.text(rng, words, weights), author=author)
+                    for _ in range(count)
+                )
+                Comment.objects.bulk_create(
+                    Comment(
+                        text=self.text(rng, words, weights),
+                        author=author,
+                        post=post,
+                    )
+                    for _ in range(count)
+                )
+                created = size
+                for query in QUERIES:
+                    first, following = self.measure(query, options)
+                    self.stdout.write(
+                        f'{size:>10} {query:>16} '
+                        f'{statistics.median(first):>10.2f} '
+                        f'{statistics.median(following):>10.2f}'
+                    )
+            transaction.set_rollback(True)
+
+    def text(self, rng, words, weights):
+        return ' '.join(rng.choices(words, weights, k=WORDS_PER_POST))
+
+    def measure(self, query, options):
+        first, following = [], []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            _, cursor = search(query, options['limit'])
+            first.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            search(query, options['limit'], cursor)
+            following.append((time.perf_counter() - start) * 1000)
+        return first, following
@@ -0,0 +1,182 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.thumbnails import thumbnail_names
+from posts.utils import pk_batches
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS expected (name TEXT PRIMARY KEY)'
+    ' WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)',
+)
+
+
+def batched(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def walk(root, top, after=()):
+    """(имя, размер, mtime) файлов под ``top`` в отсортированном порядке,
+    начиная после пути ``after``."""
+    directory = os.path.join(root, top)
+    if not os.path.isdir(directory):
+        return
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        name = f'{top}/{entry.name}'
+        parts = tuple(name.split('/'))
+        if entry.is_dir():
+            if parts >= after[:len(parts)]:
+                yield from walk(root, name, after)
+        elif parts > after:
+            stat = entry.stat()
+            yield name, stat.st_size, stat.st_mtime
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет или переносит в карантин картинки постов и миниатюры, на '
+        'которые больше не ссылается ни один пост. Сначала размечает нужные '
+        'файлы по БД, потом обходит MEDIA_ROOT; с --state продолжает '
+        'прерванный запуск.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Не трогать файлы моложе стольких часов.')
+        parser.add_argument(
+            '--quarantine',
+            help='Каталог, куда переносить файлы вместо удаления.')
+        parser.add_argument(
+            '--state', help='Файл состояния для продолжения запуска.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.options = options
+        path = options['state']
+        if not path:
+            descriptor, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(descriptor)
+        self.state = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.state.execute(statement)
+        self.files = self.bytes = 0
+        min_age = options['min_age'] * 3600
+        started = self.meta('mark_started')
+        if started is None or time.time() - started > min_age:
+            # Разметка старше окна безопасности могла пропустить новые
+            # посты; начинаем заново.
+            started = self.reset()
+        self.mark()
+        self.sweep(min(time.time() - min_age, started))
+        self.state.close()
+        os.remove(path)
+        verb = 'Можно освободить' if options['dry_run'] else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: {self.files} файлов, {self.bytes / 2 ** 20:.1f} MiB'))
+
+    def meta(self, key):
+        row = self.state.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.state.execute(
+            'INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def reset(self):
+        started = time.time()
+        with self.state:
+            self.state.execute('DELETE FROM expected')
+            self.state.execute('DELETE FROM meta')
+            self.set_meta('mark_started', started)
+        return started
+
+    def mark(self):
+        """Складывает в ``expected`` имена картинок постов и их миниатюр."""
+        if self.meta('mark_done'):
+            return
+        posts = Post.objects.exclude(image='')
+        last_pk = self.meta('mark_pk')
+        if last_pk:
+            posts = posts.filter(pk__gt=last_pk)
+        for pks in pk_batches(posts, self.options['batch_size']):
+            names = Post.objects.filter(pk__in=pks).values_list(
+                'image', flat=True)
+            rows = [
+                (expected,)
+                for name in names
+                for expected in (name, *thumbnail_names(name))
+            ]
+            with self.state:
+                self.state.executemany(
+                    'INSERT OR IGNORE INTO expected VALUES (?)', rows)
+                self.set_meta('mark_pk', pks[-1])
+        with self.state:
+            self.set_meta('mark_done', 1)
+
+    def sweep(self, cutoff):
+        root = settings.MEDIA_ROOT
+        tops = (
+            Post._meta.get_field('image').upload_to.strip('/'),
+            sorl_settings.THUMBNAIL_PREFIX.strip('/'),
+        )
+        for top in tops:
+            after = tuple((self.meta(f'sweep:{top}') or '').split('/'))
+            files = walk(root, top, after if after != ('',) else ())
+            for batch in batched(files, self.options['batch_size']):
+                self.collect_batch(
+                    [item for item in batch if item[2] < cutoff])
+                with self.state:
+                    self.set_meta(f'sweep:{top}', batch[-1][0])
+
+    def collect_batch(self, files):
+        names = [name for name, _, _ in files]
+        known = {
+            row[0] for row in self.state.execute(
+                f'SELECT name FROM expected '
+                f'WHERE name IN ({", ".join("?" * len(names))})',
+                names,
+            )
+        } if names else set()
+        # Картинку могли загрузить заново уже после разметки: одинаковые
+        # файлы хранятся под одним именем.
+        revived = set(Post.objects.filter(
+            image__in=set(names) - known).values_list('image', flat=True))
+        for name, size, _ in files:
+            if name in known or name in revived:
+                continue
+            self.files += 1
+            self.bytes += size
+            if not self.options['dry_run']:
+                self.collect(name)
+
+    def collect(self, name):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        quarantine = self.options['quarantine']
+        if quarantine:
+            target = os.path.join(quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+        if name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+            default.kvstore.delete(
+                ImageFile(name, default.storage), delete_thumbnails=False)
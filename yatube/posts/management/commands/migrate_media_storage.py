@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import content_hash
+
+from posts.caching import POSTS, bump_generation
+from posts.models import Post
+from posts.thumbnails import queue_thumbnails
+from posts.utils import pk_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога в хранилище по '
+        'хешу содержимого. Одинаковые файлы сливаются в один.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help='Не удалять старые файлы после переноса.')
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        self.moved = self.deduplicated = self.missing = self.freed = 0
+        posts = Post.objects.exclude(image='')
+        for pks in pk_batches(posts, options['batch_size']):
+            batch = [
+                post for post in Post.objects.filter(pk__in=pks).only('image')
+                if not self.storage.is_content_name(post.image.name)
+            ]
+            if options['dry_run']:
+                self.moved += len(batch)
+                continue
+            old_names = {self.move(post) for post in batch} - {None}
+            if not options['keep_old']:
+                self.delete_unreferenced(old_names)
+        if self.moved and not options['dry_run']:
+            bump_generation(POSTS)
+        verb = 'Осталось перенести' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: {self.moved}, совпадений: {self.deduplicated}, '
+            f'нет файла: {self.missing}, освобождено: '
+            f'{self.freed / 2 ** 20:.1f} MiB'))
+
+    def move(self, post):
+        old_name = post.image.name
+        if not self.storage.exists(old_name):
+            self.missing += 1
+            self.stderr.write(f'Нет файла {old_name}')
+            return None
+        with self.storage.open(old_name) as file:
+            file.content_hash = content_hash(file)
+            existed = self.storage.exists(
+                self.storage.content_name(old_name, file.content_hash))
+            new_name = self.storage.save(old_name, file)
+        Post.objects.filter(pk=post.pk).update(image=new_name)
+        post.image.name = new_name
+        queue_thumbnails(post)
+        self.moved += 1
+        self.deduplicated += existed
+        return old_name
+
+    def delete_unreferenced(self, names):
+        referenced = set(Post.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        for name in names - referenced:
+            self.freed += self.storage.size(name)
+            self.storage.delete(name)
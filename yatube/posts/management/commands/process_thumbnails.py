@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import (
+    build_thumbnails, claim_tasks, finish_tasks, forget_placeholders,
+    thumbnail_pool)
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди миниатюр: строит миниатюры картинок, загруженных '
+        'через сайт, в пуле процессов. С --once разбирает очередь и '
+        'завершается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Процессов в пуле; 0 - строить в текущем процессе.')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument('--once', action='store_true')
+
+    def handle(self, *args, **options):
+        with thumbnail_pool(options['workers']) as mapper:
+            while True:
+                tasks = claim_tasks(options['batch_size'])
+                if not tasks:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll'])
+                    continue
+                # У одной картинки может быть несколько постов.
+                names = list(dict.fromkeys(task.name for task in tasks))
+                built = dict(zip(names, mapper(build_thumbnails, names)))
+                done = [task for task in tasks if built[task.name]]
+                failed = [task for task in tasks if not built[task.name]]
+                finish_tasks(done, failed)
+                forget_placeholders(
+                    [(task.post_id, task.name) for task in done])
+                self.stdout.write(
+                    f'Построено {len(done)} из {len(tasks)}')
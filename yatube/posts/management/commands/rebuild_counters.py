@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_comment_counts, rebuild_user_stats
+from posts.models import Post
+from posts.utils import pk_batches
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок '
+        'пачками по --batch-size строк.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = self.rebuild_user_stats(batch_size)
+        posts = self.rebuild_comment_counts(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, постов: {posts}'))
+
+    def rebuild_user_stats(self, batch_size):
+        total = 0
+        for pks in pk_batches(User.objects.all(), batch_size):
+            rebuild_user_stats(pks)
+            total += len(pks)
+            self.stdout.write(f'Пользователей: {total}')
+        return total
+
+    def rebuild_comment_counts(self, batch_size):
+        total = 0
+        for pks in pk_batches(Post.objects.all(), batch_size):
+            rebuild_comment_counts(pks)
+            total += len(pks)
+            self.stdout.write(f'Постов: {total}')
+        return total
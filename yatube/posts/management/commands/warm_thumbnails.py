@@ -0,0 +1,108 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.caching import POSTS, bump_generation
+from posts.models import Post
+from posts.thumbnails import (
+    build_thumbnails, forget_cards, missing_thumbnails, thumbnail_pool)
+from posts.utils import pk_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит недостающие миниатюры картинок постов в пуле процессов. '
+        'С --checkpoint продолжает с места остановки, с --dry-run только '
+        'считает оставшуюся работу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов в пуле; 0 - строить в текущем процессе.')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду; 0 - без ограничения.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с pk последнего обработанного поста.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        posts = Post.objects.exclude(image='')
+        start = self.read_checkpoint()
+        if start:
+            posts = posts.filter(pk__gt=start)
+            self.stdout.write(f'Продолжаем после поста {start}')
+        if options['dry_run']:
+            self.dry_run(posts, options['batch_size'])
+            return
+        self.total = posts.count()
+        self.done = self.built = self.failed = 0
+        self.started = time.monotonic()
+        with thumbnail_pool(options['workers']) as mapper:
+            for pks in pk_batches(posts, options['batch_size']):
+                self.warm(mapper, pks, options['rate'])
+                self.write_checkpoint(pks[-1])
+                self.progress()
+        if self.built:
+            bump_generation(POSTS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: построено {self.built}, ошибок {self.failed}'))
+
+    def dry_run(self, posts, batch_size):
+        total = missing = 0
+        for pks in pk_batches(posts, batch_size):
+            for post in Post.objects.filter(pk__in=pks).only('image'):
+                total += 1
+                missing += bool(missing_thumbnails(post.image))
+        self.stdout.write(
+            f'Картинок: {total}, без миниатюр: {missing}')
+
+    def warm(self, mapper, pks, rate):
+        posts = [
+            post for post in Post.objects.for_feed().filter(pk__in=pks)
+            if missing_thumbnails(post.image)
+        ]
+        names = self.throttle((post.image.name for post in posts), rate)
+        built = []
+        for post, ok in zip(posts, mapper(build_thumbnails, names)):
+            if ok:
+                built.append(post)
+            else:
+                self.failed += 1
+        forget_cards(built)
+        self.built += len(built)
+        self.done += len(pks)
+
+    def throttle(self, items, rate):
+        # Executor.map забирает задачи сразу, поэтому пауза здесь
+        # ограничивает скорость постановки картинок в пул.
+        interval = 1 / rate if rate else 0
+        for item in items:
+            if interval:
+                time.sleep(interval)
+            yield item
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        speed = self.done / elapsed if elapsed else 0
+        left = (self.total - self.done) / speed if speed else 0
+        self.stdout.write(
+            f'{self.done}/{self.total} постов, построено {self.built}, '
+            f'{speed:.1f}/с, осталось ~{left:.0f} с')
+
+    def read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, pk):
+        if not self.checkpoint:
+            return
+        with open(self.checkpoint, 'w') as file:
+            file.write(str(pk))
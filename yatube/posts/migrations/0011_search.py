@@ -0,0 +1,63 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:02
+
+from django.db import migrations
+
+# DDL на момент миграции. rowid строки индекса: id * 2 для поста,
+# id * 2 + 1 для комментария.
+SOURCES = (('posts_post', 0), ('posts_comment', 1))
+TRIGGERS = ('ai', 'au', 'ad')
+
+
+def index_statements(table, kind):
+    rowid = f'id * 2 + {kind}'
+    return (
+        f'CREATE TRIGGER posts_search_{table}_ai '
+        f'AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO posts_search(rowid, text) '
+        f'VALUES (new.{rowid}, new.text); '
+        f'END',
+        f'CREATE TRIGGER posts_search_{table}_au '
+        f'AFTER UPDATE OF text ON {table} BEGIN '
+        f'UPDATE posts_search SET text = new.text '
+        f'WHERE rowid = new.{rowid}; '
+        f'END',
+        f'CREATE TRIGGER posts_search_{table}_ad '
+        f'AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM posts_search WHERE rowid = old.{rowid}; '
+        f'END',
+        f'INSERT INTO posts_search(rowid, text) '
+        f'SELECT {rowid}, text FROM {table}',
+    )
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_search USING fts5("
+        "text, tokenize='unicode61 remove_diacritics 2')"
+    )
+    for table, kind in SOURCES:
+        for statement in index_statements(table, kind):
+            schema_editor.execute(statement)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, _ in SOURCES:
+        for suffix in TRIGGERS:
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS posts_search_{table}_{suffix}')
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
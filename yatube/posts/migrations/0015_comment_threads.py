@@ -0,0 +1,61 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копии на момент миграции: живой код может измениться.
+PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+PATH_STEP = 8
+BATCH_SIZE = 500
+
+
+def path_key(pk):
+    key = ''
+    while pk:
+        pk, digit = divmod(pk, len(PATH_DIGITS))
+        key = PATH_DIGITS[digit] + key
+    return key.rjust(PATH_STEP, '0')
+
+
+def make_roots(apps, schema_editor):
+    # Все прежние комментарии становятся корнями веток.
+    Comment = apps.get_model('posts', 'Comment')
+    last_pk = 0
+    while True:
+        pks = list(
+            Comment.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        Comment.objects.bulk_update(
+            [Comment(pk=pk, path=path_key(pk)) for pk in pks], ['path'])
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_created_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(make_roots, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
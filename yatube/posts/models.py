@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -14,6 +16,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что карточка поста читает в шаблонах, одним JOIN'ом."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -32,16 +40,77 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        null=True, blank=True, editable=False)
+    image_preview = models.TextField(blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Индексы по возрастанию: SQLite читает их с конца и сразу
+        # получает порядок лент (-pub_date, -id), id - это rowid.
+        indexes = [
+            models.Index(
+                fields=['pub_date'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
 
 
+# Путь комментария - ключи его предков и его собственный, по
+# PATH_STEP символов base36 от id. Сортировка по пути даёт порядок
+# показа: ответы идут сразу за своим комментарием, ветка - это диапазон
+# [path, path + PATH_END).
+PATH_STEP = 8
+PATH_END = '~'
+PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Ответ на комментарий глубже этого уровня встаёт рядом с ним.
+COMMENT_MAX_DEPTH = 5
+
+
+def path_key(pk):
+    key = ''
+    while pk:
+        pk, digit = divmod(pk, len(PATH_DIGITS))
+        key = PATH_DIGITS[digit] + key
+    return key.rjust(PATH_STEP, '0')
+
+
+class CommentQuerySet(models.QuerySet):
+    def thread(self):
+        """Комментарии в порядке показа, с авторами."""
+        return self.select_related('author').order_by('path')
+
+    def subtree(self, comment):
+        """Комментарий и все ответы на него: один range scan по
+        индексу (post, path)."""
+        return self.filter(
+            post_id=comment.post_id,
+            path__gte=comment.path,
+            path__lt=comment.path + PATH_END,
+        )
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -53,10 +122,46 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self',
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='replies'
+    )
     text = models.TextField()
     created = models.DateTimeField(
         auto_now_add=True
     )
+    path = models.CharField(max_length=255, editable=False, default='')
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'
+            ),
+        ]
+
+    @property
+    def depth(self):
+        return len(self.path) // PATH_STEP - 1
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
+        if self.parent and self.parent.depth >= COMMENT_MAX_DEPTH:
+            self.parent = self.parent.parent
+        # INSERT и запись пути - одна транзакция: комментарий с пустым
+        # путём встал бы первым во всех ветках. Ключ пути - это id, он
+        # известен только после INSERT.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            prefix = self.parent.path if self.parent else ''
+            self.path = prefix + path_key(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
@@ -73,3 +178,96 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ['author', 'user']
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются сигналами из ``posts.signals``, пересчитываются командой
+    ``rebuild_counters``."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: посты авторов, на которых
+    подписан ``user``. Заполняется сигналами из ``posts.signals``."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class TimelineBackfill(models.Model):
+    """Очередь досыпки лент: авторы, которые снова стали push.
+
+    Строка на автора одна: повторная отписка только сдвигает
+    ``requested``. Разбирает очередь ``backfill_timelines``.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    requested = models.DateTimeField()
+
+
+class ThumbnailTask(models.Model):
+    """Очередь миниатюр: картинки, которые ждут ``process_thumbnails``.
+
+    Воркер берёт задачу в аренду до ``claimed_until`` и удаляет её только
+    после успешной сборки; задачу упавшего воркера берёт следующий.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    name = models.CharField(max_length=100)
+    created = models.DateTimeField(auto_now_add=True)
+    owner = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        # Одна картинка после дедупликации может быть у нескольких
+        # постов: карточку нужно сбросить каждому.
+        unique_together = ['post', 'name']
@@ -0,0 +1,203 @@
+import binascii
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.db.models.expressions import RawSQL
+from django.utils.encoding import force_bytes
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+
+# rowid строки индекса: id * 2 для поста, id * 2 + 1 для комментария.
+# Так триггеры и поиск обходятся без отдельной таблицы соответствий.
+TABLE = 'posts_search'
+POST = 0
+COMMENT = 1
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+_SNIPPET_TOKENS = 16
+
+Hit = namedtuple('Hit', 'post comment snippet')
+
+
+def _trigger_name(model, suffix):
+    return f'{TABLE}_{model._meta.db_table}_{suffix}'
+
+
+def _index_statements(model, kind):
+    """Триггеры синхронизации и заполнение индекса текстами ``model``."""
+    table = model._meta.db_table
+    rowid = f'id * 2 + {kind}'
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS {_trigger_name(model, "ai")} '
+        f'AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {TABLE}(rowid, text) VALUES (new.{rowid}, new.text); '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {_trigger_name(model, "au")} '
+        f'AFTER UPDATE OF text ON {table} BEGIN '
+        f'UPDATE {TABLE} SET text = new.text WHERE rowid = new.{rowid}; '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {_trigger_name(model, "ad")} '
+        f'AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM {TABLE} WHERE rowid = old.{rowid}; '
+        f'END',
+        f'INSERT INTO {TABLE}(rowid, text) SELECT {rowid}, text FROM {table}',
+    )
+
+
+def restore_index(connection):
+    """Возвращает триггеры и переиндексирует тексты, если их нет.
+
+    SQLite выполняет ALTER TABLE в миграциях через копию таблицы, и
+    триггеры старой таблицы удаляются вместе с ней.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    sources = ((Post, POST), (Comment, COMMENT))
+    triggers = {
+        _trigger_name(model, suffix)
+        for model, _ in sources
+        for suffix in ('ai', 'au', 'ad')
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        if TABLE not in existing or triggers <= existing:
+            return
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for model, kind in sources:
+            for statement in _index_statements(model, kind):
+                cursor.execute(statement)
+
+
+def match_query(text):
+    """Строка пользователя -> запрос FTS5: все слова, каждое в кавычках.
+
+    Синтаксис FTS5 (OR, NEAR, *, двоеточия) из ввода не пропускается,
+    поэтому запрос не может упасть с ошибкой разбора.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def encode_cursor(rank, rowid):
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{rowid}'))
+
+
+def decode_cursor(token):
+    """Возвращает (rank, rowid) или None для битого токена."""
+    try:
+        rank, rowid = urlsafe_base64_decode(token).decode().split('|')
+        return float(rank), int(rowid)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(_HIGHLIGHT_START, '<mark>')
+        .replace(_HIGHLIGHT_END, '</mark>')
+    )
+
+
+def _candidate_window(db, query, model, kind):
+    """Границы rowid ``SEARCH_CANDIDATES`` самых новых совпадений вида
+    ``kind``. Порог FTS5 находит по списку документов без bm25, начиная
+    с последнего id таблицы ``model``."""
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    high = last * 2 + kind
+    db.execute(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+        f'AND rowid <= %s AND rowid & 1 = {kind} '
+        f'ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+        [query, high, settings.SEARCH_CANDIDATES - 1],
+    )
+    row = db.fetchone()
+    return (row[0] if row else 0), high
+
+
+def _ranked_rows(query, cursor, limit):
+    """Строки индекса по ``rank``.
+
+    Сортировка по rank всех совпадений частого слова растёт с таблицей,
+    поэтому ранжируются только ``SEARCH_CANDIDATES`` самых новых постов
+    и столько же комментариев. У постов и комментариев свои
+    последовательности id, и общий порог rowid отсекал бы комментарии,
+    поэтому окно у каждого вида своё, а страницы видов сливаются. Более
+    старые совпадения частых слов в выдачу не попадают.
+    """
+    rows = []
+    with connection.cursor() as db:
+        for model, kind in ((Post, POST), (Comment, COMMENT)):
+            low, high = _candidate_window(db, query, model, kind)
+            sql = (
+                f'SELECT rowid, rank, snippet({TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'AND rowid BETWEEN %s AND %s AND rowid & 1 = {kind}'
+            )
+            params = [
+                _HIGHLIGHT_START, _HIGHLIGHT_END, '…', _SNIPPET_TOKENS,
+                query, low, high]
+            if cursor is not None:
+                rank, rowid = cursor
+                sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+                params += [rank, rank, rowid]
+            sql += ' ORDER BY rank, rowid LIMIT %s'
+            params.append(limit)
+            db.execute(sql, params)
+            rows += db.fetchall()
+    rows.sort(key=lambda row: (row[1], row[0]))
+    return rows[:limit]
+
+
+def search(text, limit, token=None):
+    """Страница результатов по релевантности (bm25) и курсор следующей.
+
+    Возвращает (hits, next_cursor). Курсор - пара (rank, rowid)
+    последнего результата, поэтому следующая страница не пересчитывает
+    уже показанные через OFFSET.
+    """
+    query = match_query(text)
+    if not query:
+        return [], None
+    cursor = decode_cursor(token) if token else None
+    rows = _ranked_rows(query, cursor, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    comments = Comment.objects.select_related('author').in_bulk(
+        [rowid // 2 for rowid, _, _ in rows if rowid % 2 == COMMENT])
+    posts = Post.objects.for_feed().in_bulk(
+        [rowid // 2 for rowid, _, _ in rows if rowid % 2 == POST]
+        + [comment.post_id for comment in comments.values()]
+    )
+    hits = []
+    for rowid, _, snippet in rows:
+        comment = None
+        if rowid % 2 == COMMENT:
+            comment = comments.get(rowid // 2)
+            post = posts.get(comment.post_id) if comment else None
+        else:
+            post = posts.get(rowid // 2)
+        if post is not None:
+            hits.append(Hit(post, comment, highlight(snippet)))
+    return hits, next_cursor
+
+
+def matching_posts(text):
+    """Выражение для ``filter(pk__in=...)``: id постов, чей текст
+    совпадает с запросом."""
+    return RawSQL(
+        f'SELECT rowid / 2 FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND rowid & 1 = {POST}',
+        (match_query(text),),
+    )
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .caching import bump_generation, COMMENTS, FOLLOWS, POSTS
+from .counters import bump_user
+from .feed import fill_timeline, followers_count, is_pushed, queue_backfill
+from .models import Comment, Follow, Group, Post, Timeline, UserStats
+from .search import restore_index
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def invalidate_post_pages(sender, **kwargs):
+    bump_generation(POSTS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_post_pages_on_user_change(sender, update_fields, **kwargs):
+    # Вход пользователя сохраняет только last_login - на ленту это
+    # не влияет.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_generation(POSTS)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, **kwargs):
+    bump_generation(COMMENTS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, **kwargs):
+    bump_generation(FOLLOWS)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    bump_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, 'followers_count', 1)
+        bump_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    bump_user(instance.author_id, 'followers_count', -1)
+    bump_user(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_followers(sender, instance, created, **kwargs):
+    if not created or not is_pushed(instance.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=instance.author_id).values_list('user_id', flat=True)
+    fill_timeline(
+        Timeline(
+            user_id=user_id,
+            author_id=instance.author_id,
+            post=instance,
+            pub_date=instance.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if not created or not is_pushed(instance.author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=instance.author_id).values_list('pk', 'pub_date')
+    fill_timeline(
+        Timeline(
+            user_id=instance.user_id,
+            author_id=instance.author_id,
+            post_id=post_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_timeline(sender, instance, **kwargs):
+    Timeline.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id).delete()
+
+
+@receiver(post_delete, sender=Follow)
+def backfill_on_push_limit(sender, instance, **kwargs):
+    # Автор опустился ниже TIMELINE_PUSH_LIMIT и снова push: его посты
+    # перестают подмешиваться при чтении, значит, должны лежать в лентах.
+    # После коммита - при каскадном удалении автора его уже не будет.
+    author_id = instance.author_id
+    if followers_count(author_id) == settings.TIMELINE_PUSH_LIMIT - 1:
+        transaction.on_commit(lambda: queue_backfill(author_id))
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.name == 'posts':
+        restore_index(connections[using])
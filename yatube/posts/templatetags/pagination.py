@@ -0,0 +1,14 @@
+from django import template
+
+from posts.utils import page_window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_numbers(page_obj):
+    """Окно номеров страниц для paginator.html; у страницы, открытой по
+    курсору, номера нет, и окно пустое."""
+    if not page_obj.number:
+        return []
+    return page_window(page_obj.number, page_obj.paginator.num_pages)
@@ -0,0 +1,52 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_VARIANTS = ('feed', 'group', 'profile')
+
+
+def card_version(post):
+    """Отпечаток всего, что выводит карточка: правка поста, имени автора
+    или группы даёт новый ключ, и старый фрагмент просто не читается."""
+    author, group = post.author, post.group
+    fields = (
+        post.text,
+        post.image.name or '',
+        post.pub_date.isoformat(),
+        author.username,
+        author.first_name,
+        author.last_name,
+        group.slug if group else '',
+    )
+    return hashlib.md5('\x1f'.join(fields).encode()).hexdigest()
+
+
+def card_key(post, variant):
+    return f'post_card:{variant}:{post.pk}:{card_version(post)}'
+
+
+@register.simple_tag
+def post_cards(posts, variant='feed'):
+    """HTML карточек постов страницы: одним get_many из кэша, недостающие
+    рендерятся и сохраняются одним set_many."""
+    keys = {card_key(post, variant): post for post in posts}
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for key, post in keys.items():
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'variant': variant})
+            missing[key] = card
+        cards.append(mark_safe(card))
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
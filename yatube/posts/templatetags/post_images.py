@@ -0,0 +1,22 @@
+from django import template
+
+from posts.thumbnails import (
+    cached_thumbnails, missing_thumbnails, picture, queue_thumbnails)
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Миниатюры картинки поста для ``<picture>`` или None.
+
+    Недостающие миниатюры ставятся в очередь, а шаблон рисует заглушку:
+    запрос страницы никогда не ресайзит картинку сам.
+    """
+    if not post.image:
+        return None
+    # Все ключи KV-хранилища sorl читаются один раз на картинку.
+    thumbnails = cached_thumbnails(post.image)
+    if missing_thumbnails(post.image, thumbnails):
+        queue_thumbnails(post)
+    return picture(post.image, thumbnails)
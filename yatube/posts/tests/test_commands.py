@@ -0,0 +1,108 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from posts.models import Post
+from posts.thumbnails import thumbnail_names
+from django.conf import settings
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MigrateMediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_moves_images_to_content_addressed_names(self):
+        old_name = default_storage.save(
+            'posts/legacy.gif', ContentFile(SMALL_GIF))
+        post = Post.objects.create(
+            author=self.user, text='Старый пост', image=old_name)
+        call_command('migrate_media_storage', stdout=StringIO())
+        post.refresh_from_db()
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(
+            post.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, old_name)))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def make_file(self, name, age=48 * 3600):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(name.encode())
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.kept = [
+            self.make_file('posts/ab/cd/kept.gif'),
+            self.make_file(thumbnail_names('posts/ab/cd/kept.gif')[0]),
+            self.make_file('posts/fresh.gif', age=0),
+        ]
+        self.orphans = [
+            self.make_file('posts/ab/cd/orphan.gif'),
+            self.make_file('cache/00/00/orphan.jpg'),
+        ]
+        Post.objects.create(
+            author=self.user, text='Пост', image='posts/ab/cd/kept.gif')
+
+    def test_deletes_orphans(self):
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+        self.assertIn('Освобождено: 2 файлов', out.getvalue())
+        for path in self.kept:
+            self.assertTrue(os.path.exists(path), path)
+        for path in self.orphans:
+            self.assertFalse(os.path.exists(path), path)
+
+    def test_dry_run_and_quarantine(self):
+        call_command('collect_media', dry_run=True, stdout=StringIO())
+        for path in self.orphans:
+            self.assertTrue(os.path.exists(path), path)
+        quarantine = os.path.join(TEMP_MEDIA_ROOT, 'quarantine')
+        call_command(
+            'collect_media', quarantine=quarantine, stdout=StringIO())
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'posts/ab/cd/orphan.gif')))
+        self.assertFalse(os.path.exists(self.orphans[0]))
@@ -1,7 +1,10 @@
+import hashlib
 import shutil
 import tempfile
+from io import StringIO
 from django.test import TestCase, Client, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from posts.models import Post, Group
 from django.urls import reverse
@@ -24,6 +27,7 @@ class FormsTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        cls.small_gif = small_gif
         cls.image = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -80,9 +84,46 @@ class FormsTests(TestCase):
                 text='Тест текст нового поста',
                 author=self.user.id,
                 group=self.group.id,
-                image='posts/small.gif',).exists())
+                image=self.image_name(self.small_gif),).exists())
         self.assertEqual(response.status_code, 200)
 
+    def image_name(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        return f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+
+    def test_same_image_stored_once(self):
+        for text in ('Первый', 'Второй'):
+            image = SimpleUploadedFile('same.gif', self.small_gif, 'image/gif')
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': text, 'image': image})
+        names = set(Post.objects.filter(
+            text__in=('Первый', 'Второй')).values_list('image', flat=True))
+        self.assertEqual(names, {self.image_name(self.small_gif)})
+
+    def assert_image_metadata(self, post):
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(self.small_gif))
+        self.assertTrue(
+            post.image_preview.startswith('data:image/jpeg;base64,'))
+
+    def test_create_post_records_image_metadata(self):
+        image = SimpleUploadedFile('meta.gif', self.small_gif, 'image/gif')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с размерами', 'image': image})
+        self.assert_image_metadata(Post.objects.get(text='Пост с размерами'))
+
+    def test_backfill_image_metadata(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Старый пост',
+            image=SimpleUploadedFile('old.gif', self.small_gif, 'image/gif'))
+        self.assertIsNone(post.image_width)
+        call_command('backfill_image_metadata', stdout=StringIO())
+        post.refresh_from_db()
+        self.assert_image_metadata(post)
+
     def test_new_post_with_wrong_image(self):
         small_not_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
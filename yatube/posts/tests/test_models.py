@@ -1,9 +1,27 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
-from posts.models import Group, Post
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from posts.models import Comment, Follow, Group, Post, Timeline, UserStats
 
 User = get_user_model()
 
+GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -29,3 +47,148 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_str = group.title
         self.assertEqual(expected_str, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        Follow.objects.create(author=self.author, user=self.reader)
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        post.delete()
+        Follow.objects.all().delete()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 0)
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_rebuild_counters(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        UserStats.objects.all().delete()
+        Post.objects.update(comments_count=0)
+        call_command('rebuild_counters', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+
+
+class ImportDataTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_data(self, kind, content, name, **options):
+        stdout = StringIO()
+        call_command(
+            'import_data', kind, self.write(name, content),
+            batch_size=2, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_imports_and_rebuilds_derived_data(self):
+        self.import_data(
+            'users', 'username,first_name\nlev,Лев\nreader,\n', 'users.csv')
+        self.import_data('groups', json.dumps(
+            {'slug': 'classic', 'title': 'Классика'}) + '\n', 'groups.ndjson')
+        self.import_data('follows', json.dumps(
+            {'user': 'reader', 'author': 'lev'}) + '\n', 'follows.ndjson')
+        posts = '\n'.join(json.dumps(row) for row in [
+            {'id': 10, 'text': 'Война и мир', 'author': 'lev',
+             'group': 'classic', 'pub_date': '1869-01-01T00:00:00'},
+            {'text': 'Анна Каренина', 'author': 'lev'},
+            {'text': 'Чужой', 'author': 'nobody'},
+        ])
+        output = self.import_data(
+            'posts', posts, 'posts.ndjson', defer_indexes=True)
+        self.assertIn('Импортировано 2 из 3, пропущено (author: 1)', output)
+        comments = '\n'.join(json.dumps(row) for row in [
+            {'id': 1, 'post': 10, 'author': 'reader', 'text': 'Вопрос'},
+            {'id': 2, 'post': 10, 'author': 'lev', 'text': 'Ответ',
+             'parent': 1},
+            {'id': 3, 'post': 10, 'author': 'reader', 'text': 'Спасибо',
+             'parent': 2},
+        ])
+        self.import_data('comments', comments, 'comments.ndjson')
+
+        war = Post.objects.get(pk=10)
+        self.assertEqual(war.pub_date.year, 1869)
+        self.assertEqual(war.group.slug, 'classic')
+        self.assertEqual(war.comments_count, 3)
+        lev = User.objects.get(username='lev')
+        self.assertEqual(lev.first_name, 'Лев')
+        self.assertFalse(lev.has_usable_password())
+        self.assertEqual(lev.stats.posts_count, 2)
+        self.assertEqual(lev.stats.followers_count, 1)
+        self.assertEqual(
+            Timeline.objects.filter(user__username='reader').count(), 2)
+        self.assertEqual(
+            [comment.depth for comment in Comment.objects.thread()],
+            [0, 1, 2])
+        self.assertEqual(
+            list(Comment.objects.subtree(Comment.objects.get(pk=2))
+                 .values_list('pk', flat=True)),
+            [2, 3])
+        self.assertLessEqual(
+            {index.name for index in Post._meta.indexes},
+            set(self.index_names('posts_post')))
+
+    def test_reimport_is_idempotent(self):
+        content = 'id,username\n5,lev\n'
+        output = self.import_data('users', content, 'users.csv')
+        self.assertIn('Импортировано 1 из 1', output)
+        output = self.import_data(
+            'users', content + '6,lev\n7,tolstoy\n7,other\n', 'users.csv')
+        self.assertIn(
+            'Импортировано 1 из 4, пропущено (conflict: 3)', output)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_counters_of_touched_rows_only(self):
+        self.import_data('users', 'username\nlev\nreader\n', 'users.csv')
+        stranger = User.objects.create_user(username='stranger')
+        UserStats.objects.filter(user=stranger).update(posts_count=42)
+        self.import_data('follows', json.dumps(
+            {'user': 'reader', 'author': 'lev'}) + '\n', 'follows.ndjson')
+        self.assertEqual(
+            User.objects.get(username='lev').stats.followers_count, 1)
+        self.assertEqual(
+            User.objects.get(username='reader').stats.following_count, 1)
+        stranger.stats.refresh_from_db()
+        self.assertEqual(stranger.stats.posts_count, 42)
+
+    def test_image_metadata_filled(self):
+        self.import_data('users', 'username\nlev\n', 'users.csv')
+        with override_settings(MEDIA_ROOT=self.directory):
+            name = default_storage.save('posts/small.gif', ContentFile(GIF))
+            self.import_data('posts', json.dumps(
+                {'id': 1, 'text': 'С картинкой', 'author': 'lev',
+                 'image': name}) + '\n', 'posts.ndjson')
+        post = Post.objects.get(pk=1)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(GIF))
+        self.assertTrue(post.image_preview.startswith('data:image/jpeg'))
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table)
+        return [name for name, info in constraints.items() if info['index']]
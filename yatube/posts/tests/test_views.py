@@ -1,13 +1,36 @@
+import os
 import shutil
 import tempfile
-from django.test import TestCase, Client, override_settings
+from io import StringIO
+from unittest import mock
+from django.test import (
+    TestCase, TransactionTestCase, Client, RequestFactory, override_settings)
+from django.contrib.auth.models import AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
-from posts.models import Post, Group, Comment, Follow
+from posts import views
+from posts.caching import _page_key, incr_counter, view_cache_stats, POSTS
+from posts.feed import feed_path_stats, PULL
+from posts.models import (
+    COMMENT_MAX_DEPTH, Post, Group, Comment, Follow, ThumbnailTask, Timeline,
+    TimelineBackfill)
+from posts.search import restore_index
+from posts.templatetags.post_cards import card_key
+from posts.templatetags.post_images import post_picture
+from posts.thumbnails import (
+    claim_tasks, finish_tasks, picture, queue_thumbnails)
+from posts.utils import page_window
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 from django.conf import settings
-from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.core.cache import cache, caches
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -157,7 +180,73 @@ class ViewsTests(TestCase):
     def test_new_comment_is_demonstrated(self):
         response = self.guest_client.get(self.url_post_detail)
         comment = response.context.get('comments')
-        self.assertTrue(comment.filter(text='Тестовый комментарий').exists())
+        self.assertIn(self.comment, comment)
+
+    @override_settings(NUMBER_OF_COMMENTS=2)
+    def test_comments_are_loaded_by_cursor(self):
+        comments = [self.comment] + [
+            Comment.objects.create(
+                post=self.post, author=self.follow, text=f'Комментарий {i}')
+            for i in range(3)
+        ]
+        response = self.guest_client.get(self.url_post_detail)
+        self.assertEqual(response.context['comments'], comments[:2])
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        loaded = []
+        cursor = response.context['next_cursor']
+        while cursor:
+            with self.assertNumQueries(2):
+                response = self.guest_client.get(url, {'cursor': cursor})
+            loaded += response.context['comments']
+            cursor = response.context['next_cursor']
+        self.assertEqual(loaded, comments[2:])
+        self.assertContains(response, 'Комментарий 2')
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_replies_follow_their_thread(self):
+        reply = Comment.objects.create(
+            post=self.post, author=self.follow, text='Ответ',
+            parent=self.comment)
+        later = Comment.objects.create(
+            post=self.post, author=self.follow, text='Второй корень')
+        self.authorized_client.post(
+            self.url_comment, {'text': 'Ответ на ответ', 'parent': reply.pk})
+        nested = Comment.objects.get(text='Ответ на ответ')
+        self.assertEqual((nested.parent, nested.depth), (reply, 2))
+        response = self.guest_client.get(self.url_post_detail)
+        self.assertEqual(
+            response.context['comments'],
+            [self.comment, reply, nested, later])
+        url = reverse('posts:comment_thread', kwargs={
+            'post_id': self.post.pk, 'comment_id': reply.pk})
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.context['comments'], [reply, nested])
+
+    def test_reply_to_other_post_is_rejected(self):
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text='Чужой')
+        self.authorized_client.post(
+            self.url_comment, {'text': 'Ответ', 'parent': foreign.pk})
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+    def test_deep_replies_are_flattened(self):
+        parent = self.comment
+        for _ in range(COMMENT_MAX_DEPTH + 2):
+            parent = Comment.objects.create(
+                post=self.post, author=self.user, text='Ответ',
+                parent=parent)
+        self.assertEqual(parent.depth, COMMENT_MAX_DEPTH)
+
+    def test_comment_without_path_is_rolled_back(self):
+        count = Comment.objects.count()
+        with mock.patch.object(
+                QuerySet, 'update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Сбой')
+        self.assertEqual(Comment.objects.count(), count)
 
     def test_authorized_client_can_follow(self):
         follow_count_1 = Follow.objects.count()
@@ -185,13 +274,153 @@ class ViewsTests(TestCase):
         new_post = response.context['page_obj']
         self.assertEqual(0, len(new_post))
 
+    def test_timeline_follows_subscriptions(self):
+        Follow.objects.create(author=self.user, user=self.follow)
+        self.assertTrue(Timeline.objects.filter(
+            user=self.follow, post=self.post).exists())
+        new_post = Post.objects.create(text='Новый пост', author=self.user)
+        response = self.authorized_client_2.get(reverse(
+            'posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        Follow.objects.filter(author=self.user, user=self.follow).delete()
+        self.assertFalse(Timeline.objects.filter(user=self.follow).exists())
+
+    @override_settings(TIMELINE_PUSH_LIMIT=1)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(author=self.user, user=self.follow)
+        new_post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertFalse(Timeline.objects.filter(user=self.follow).exists())
+        response = self.authorized_client_2.get(reverse(
+            'posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post])
+        self.assertEqual(feed_path_stats()[PULL], 1)
+
     def test_cache_index(self):
         text = 'abc'
-        Post.objects.create(text=text, author=self.user)
+        post = Post.objects.create(text=text, author=self.user)
         self.authorized_client.get(reverse('posts:index'))
-        Post.objects.all().delete()
+        Post.objects.filter(pk=post.pk).update(text='xyz')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIn(text, str(response.content))
+
+    def test_cache_index_invalidated_by_changes(self):
+        text = 'abc'
+        post = Post.objects.create(text=text, author=self.user)
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertIn(text, str(response.content))
+        post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn(text, str(response.content))
+        new_post = Post.objects.create(text='новый', author=self.user)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    def test_stale_index_served_while_recomputing(self):
+        self.guest_client.get(self.url_index)
+        self.guest_client.get(self.url_index)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        request = RequestFactory().get(self.url_index)
+        request.user = AnonymousUser()
+        cache.add(f'{_page_key(views.index, request)}:lock', 1)
+        response = self.guest_client.get(self.url_index)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(view_cache_stats(POSTS), {
+            'hit': 1, 'miss': 1, 'stale': 1, 'recompute': 1})
+
+    def test_counter_writes_once_per_event(self):
+        default = caches['default']
+        with mock.patch.object(default, 'add', wraps=default.add) as add:
+            for _ in range(3):
+                incr_counter('test:counter')
+        self.assertEqual(add.call_count, 1)
+        self.assertEqual(cache.get('test:counter'), 3)
+
+    def test_post_card_fragment_cache(self):
+        self.authorized_client.get(self.url_profile)
+        old_key = card_key(self.post, 'profile')
+        self.assertIn('Тестовый пост', cache.get(old_key))
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        self.assertNotEqual(card_key(post, 'profile'), old_key)
+        response = self.authorized_client.get(self.url_profile)
+        self.assertContains(response, 'Новое имя')
+
+    def test_not_modified_without_queries(self):
+        for url in (self.url_index, self.url_group,
+                    self.url_profile, self.url_post_detail):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_follows_changes_and_viewer(self):
+        etag = self.guest_client.get(self.url_post_detail)['ETag']
+        user_etag = self.authorized_client.get(self.url_post_detail)['ETag']
+        self.assertNotEqual(etag, user_etag)
+        Comment.objects.create(
+            post=self.post, author=self.follow, text='Новый комментарий')
+        response = self.guest_client.get(
+            self.url_post_detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+        etag = self.guest_client.get(self.url_profile)['ETag']
+        Follow.objects.create(user=self.follow, author=self.user)
+        response = self.guest_client.get(
+            self.url_profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_thumbnail_placeholder_until_generated(self):
+        response = self.guest_client.get(self.url_index)
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertTrue(ThumbnailTask.objects.filter(
+            post=self.post, name=self.post.image.name).exists())
+        call_command(
+            'process_thumbnails', workers=0, once=True, stdout=StringIO())
+        self.assertFalse(ThumbnailTask.objects.exists())
+        response = self.guest_client.get(self.url_index)
+        self.assertContains(response, '<img class="card-img')
+        self.assertContains(response, '<source type="image/webp"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f'.webp {width}w')
+            self.assertContains(response, f'.jpg {width}w')
+
+    def test_thumbnail_tasks_survive_failures(self):
+        queue_thumbnails(self.post)
+        claimed = claim_tasks(10)
+        self.assertEqual([task.post for task in claimed], [self.post])
+        # Воркер упал, не собрав миниатюры: задача ждёт конца аренды.
+        self.assertEqual(claim_tasks(10), [])
+        ThumbnailTask.objects.update(claimed_until=timezone.now())
+        with override_settings(THUMBNAIL_TASK_ATTEMPTS=3):
+            task, = claim_tasks(10)
+            self.assertEqual(task.attempts, 2)
+            finish_tasks([], [task])
+            self.assertTrue(ThumbnailTask.objects.exists())
+        with override_settings(THUMBNAIL_TASK_ATTEMPTS=2):
+            finish_tasks([], [task])
+        self.assertFalse(ThumbnailTask.objects.exists())
+
+    def test_shared_image_queued_for_every_post(self):
+        twin = Post.objects.create(
+            author=self.user, text='Та же картинка', image=self.post.image)
+        self.guest_client.get(self.url_index)
+        self.assertEqual(
+            set(ThumbnailTask.objects.values_list('post_id', flat=True)),
+            {self.post.pk, twin.pk})
+        call_command(
+            'process_thumbnails', workers=0, once=True, stdout=StringIO())
+        self.assertFalse(ThumbnailTask.objects.exists())
+        response = self.guest_client.get(self.url_index)
+        self.assertContains(response, '<img class="card-img', count=2)
 
     def test_comment_create(self):
         Post.objects.create(
@@ -215,6 +444,122 @@ class ViewsTests(TestCase):
 PAGE_TEST_OFFSET = 5
 
 
+@override_settings(TIMELINE_PUSH_LIMIT=2)
+class PushLimitTests(TransactionTestCase):
+    """Переход автора через TIMELINE_PUSH_LIMIT в обе стороны. Досыпка
+    ставится в очередь в on_commit, поэтому нужны настоящие транзакции."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.first, self.second = (
+            User.objects.create_user(username=name)
+            for name in ('first', 'second'))
+
+    def timeline(self, user):
+        return set(Timeline.objects.filter(
+            user=user).values_list('post__text', flat=True))
+
+    def feed(self, user):
+        client = Client()
+        client.force_login(user)
+        response = client.get(reverse('posts:follow_index'))
+        return {post.text for post in response.context['page_obj']}
+
+    def backfill(self):
+        call_command('backfill_timelines', once=True, stdout=StringIO())
+
+    def test_timeline_reconciled_when_author_crosses_limit(self):
+        Follow.objects.create(user=self.first, author=self.author)
+        Post.objects.create(author=self.author, text='До')
+        self.assertEqual(self.timeline(self.first), {'До'})
+        # Второй подписчик делает автора pull: ни досыпки, ни push.
+        Follow.objects.create(user=self.second, author=self.author)
+        Post.objects.create(author=self.author, text='После')
+        self.assertEqual(self.timeline(self.second), set())
+        self.assertEqual(self.feed(self.second), {'До', 'После'})
+        # Отписка возвращает автора в push: ленты досыпает воркер.
+        Follow.objects.filter(user=self.first).delete()
+        self.assertEqual(self.timeline(self.second), set())
+        self.backfill()
+        self.assertEqual(self.timeline(self.second), {'До', 'После'})
+        self.assertEqual(self.feed(self.second), {'До', 'После'})
+        self.assertFalse(TimelineBackfill.objects.exists())
+
+    def test_repeated_unfollows_queue_one_backfill(self):
+        Follow.objects.create(user=self.second, author=self.author)
+        for _ in range(3):
+            Follow.objects.create(user=self.first, author=self.author)
+            Follow.objects.filter(user=self.first).delete()
+        self.assertEqual(
+            TimelineBackfill.objects.filter(author=self.author).count(), 1)
+
+    def test_deleted_author_is_not_queued(self):
+        Follow.objects.create(user=self.first, author=self.author)
+        Follow.objects.create(user=self.second, author=self.author)
+        self.author.delete()
+        self.assertFalse(TimelineBackfill.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('warm.gif', small_gif, 'image/gif'),
+        )
+        Post.objects.create(author=cls.user, text='Пост без картинки')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def warm(self, **options):
+        out = StringIO()
+        call_command('warm_thumbnails', workers=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_counts_missing(self):
+        self.assertIn('без миниатюр: 1', self.warm(dry_run=True))
+        self.assertIsNone(picture(self.post.image))
+
+    def test_builds_missing_and_resumes(self):
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'warm.checkpoint')
+        self.assertIn('построено 1', self.warm(checkpoint=checkpoint))
+        self.assertIsNotNone(picture(self.post.image))
+        self.assertIn('без миниатюр: 0', self.warm(dry_run=True))
+        out = self.warm(checkpoint=checkpoint)
+        self.assertIn('Продолжаем после поста', out)
+        self.assertIn('построено 0', out)
+
+    def test_post_picture_reads_kvstore_once(self):
+        self.warm()
+        kv_cache = caches['default']
+        with mock.patch.object(
+                kv_cache, 'get_many', wraps=kv_cache.get_many) as get_many:
+            with mock.patch.object(
+                    kv_cache, 'get', wraps=kv_cache.get) as get:
+                self.assertIsNotNone(post_picture(self.post))
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(get.call_count, 0)
+
+
 class ViewsTests_paginator(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -254,3 +599,258 @@ class ViewsTests_paginator(TestCase):
                 response = self.client.get(reverse_name + '?page=2')
                 self.assertEqual(len(
                     response.context['page_obj']), PAGE_TEST_OFFSET)
+
+    def test_cursor_pages(self):
+        reverse_list = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        for reverse_name in reverse_list:
+            with self.subTest(reverse_name=reverse_name):
+                cache.clear()
+                first_page = self.client.get(reverse_name).context['page_obj']
+                response = self.client.get(
+                    reverse_name, {'cursor': first_page.next_cursor})
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), PAGE_TEST_OFFSET)
+                self.assertFalse(second_page.has_next())
+                response = self.client.get(
+                    reverse_name, {'cursor': second_page.previous_cursor})
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    list(first_page))
+
+    def test_broken_cursor_opens_first_page(self):
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    @override_settings(NUMBERED_PAGES_LIMIT=1)
+    def test_numbered_pages_are_limited(self):
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.user.username}))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 1)
+        self.assertTrue(page_obj.paginator.is_truncated)
+        self.assertIsNotNone(page_obj.next_cursor)
+
+    def test_page_window(self):
+        self.assertEqual(page_window(1, 3), [1, 2, 3])
+        self.assertEqual(
+            page_window(50, 100), [1, None, 48, 49, 50, 51, 52, None, 100])
+        self.assertEqual(page_window(97, 100), [1, None, *range(95, 101)])
+
+    def test_paginator_renders_window(self):
+        page_obj = Paginator(range(10 ** 7), 10).page(500)
+        html = render_to_string(
+            'posts/includes/paginator.html', {'page_obj': page_obj})
+        self.assertEqual(html.count('class="page-item'), 11)
+        self.assertIn('?page=1000000"', html)
+        self.assertIn('…', html)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='Тест-1',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(author=cls.author, user=cls.reader)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий')
+        cls.budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:follow_index'): 5,
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}): 5,
+            reverse('posts:profile', kwargs={'username': 'auth'}): 6,
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}): 4,
+        }
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_page_size(self):
+        before = {url: self.count_queries(url) for url in self.budgets}
+        for i in range(settings.NUMBER_OF_POSTS * 2):
+            commenter = User.objects.create_user(username=f'user_{i}')
+            Post.objects.create(
+                author=self.author, text='Ещё пост', group=self.group)
+            Comment.objects.create(
+                author=commenter, post=self.post, text='Комментарий')
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                queries = self.count_queries(url)
+                self.assertEqual(queries, before[url])
+                self.assertLessEqual(queries, budget)
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(author=cls.author, user=cls.reader)
+        for i in range(settings.NUMBER_OF_POSTS + 1):
+            cls.post = Post.objects.create(
+                author=cls.author, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            author=cls.reader, post=cls.post, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def plans(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+        self.response = response
+
+    def assert_indexed(self, url, data=None):
+        for sql, plan in self.plans(url, data):
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    # Подзапрос ограниченного COUNT(*) - не больше
+                    # страниц * постов строк.
+                    if step.startswith('SCAN') and step != 'SCAN subquery':
+                        self.assertIn('USING', step)
+
+    def test_hot_queries_use_indexes(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            self.assert_indexed(url)
+            page_obj = self.response.context.get('page_obj')
+            if page_obj is not None:
+                self.assert_indexed(url, {'cursor': page_obj.next_cursor})
+
+    @override_settings(TIMELINE_PUSH_LIMIT=1)
+    def test_pulled_feed_uses_indexes(self):
+        self.assert_indexed(reverse('posts:follow_index'))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Котики <b>и</b> собаки')
+        cls.other_post = Post.objects.create(
+            author=cls.user, text='Котики, котики, котики')
+        cls.comment = Comment.objects.create(
+            author=cls.user, post=cls.post, text='Люблю Котиков')
+        cls.url = reverse('posts:search')
+
+    def search(self, query, **data):
+        return self.client.get(self.url, {'q': query, **data}).context
+
+    def test_ranks_and_highlights(self):
+        hits = self.search('котики')['hits']
+        self.assertEqual(
+            [hit.post for hit in hits], [self.other_post, self.post])
+        self.assertIn('<mark>Котики</mark>', hits[1].snippet)
+        self.assertIn('&lt;b&gt;', hits[1].snippet)
+
+    def test_finds_comments(self):
+        hits = self.search('котиков')['hits']
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].comment, self.comment)
+        self.assertEqual(hits[0].post, self.post)
+
+    def test_index_follows_changes(self):
+        self.post.text = 'Только собаки'
+        self.post.save()
+        Post.objects.filter(pk=self.other_post.pk).delete()
+        self.assertEqual(self.search('котики')['hits'], [])
+        self.assertEqual(len(self.search('собаки')['hits']), 1)
+
+    def test_index_restored_after_table_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_search_posts_post_ai')
+            cursor.execute('DELETE FROM posts_search')
+        restore_index(connection)
+        Post.objects.create(author=self.user, text='Жирафы')
+        self.assertEqual(len(self.search('жирафы')['hits']), 1)
+        self.assertEqual(len(self.search('котики')['hits']), 2)
+
+    @override_settings(NUMBER_OF_POSTS=1)
+    def test_cursor_pages(self):
+        first = self.search('котики')
+        second = self.search('котики', cursor=first['next_cursor'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(
+            [hit.post for hit in first['hits'] + second['hits']],
+            [self.other_post, self.post])
+
+    @override_settings(SEARCH_CANDIDATES=1)
+    def test_ranks_only_newest_candidates(self):
+        hits = self.search('котики')['hits']
+        self.assertEqual([hit.post for hit in hits], [self.other_post])
+
+    @override_settings(SEARCH_CANDIDATES=2)
+    def test_fresh_comment_beats_older_posts(self):
+        for number in range(5):
+            Post.objects.create(author=self.user, text=f'Жирафы {number}')
+        comment = Comment.objects.create(
+            author=self.user, post=self.post, text='Жирафы, жирафы, жирафы')
+        hits = self.search('жирафы')['hits']
+        self.assertEqual(hits[0].comment, comment)
+        self.assertEqual(len(hits), 3)
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        for query in ('"', 'NEAR(', 'котики OR', '*', 'text:', ''):
+            with self.subTest(query=query):
+                response = self.client.get(self.url, {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_search(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post])
+
+    def test_admin_search_without_words(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:posts_post_changelist')
+        for query in ('!!!', '*', '"', 'NEAR('):
+            with self.subTest(query=query):
+                response = self.client.get(url, {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    list(response.context['cl'].result_list), [])
@@ -0,0 +1,252 @@
+import logging
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from .caching import POSTS, bump_generation
+from .images import (
+    FALLBACK_FORMAT, MIME_TYPES, encoder_options, supported_formats)
+from .models import Post, ThumbnailTask
+from .templatetags.post_cards import CARD_VARIANTS, card_key
+
+logger = logging.getLogger(__name__)
+
+# Картинка поста всегда обрезается до пропорций 960x339.
+CARD_SIZE = (960, 339)
+
+Source = namedtuple('Source', 'type srcset')
+Picture = namedtuple('Picture', 'img srcset sources')
+
+
+def _thumbnail_variants():
+    width, height = CARD_SIZE
+    variants = {}
+    for format_ in supported_formats():
+        options = {
+            'crop': 'center',
+            'upscale': True,
+            'format': format_,
+            'quality': encoder_options(format_).get('quality'),
+        }
+        for size in settings.POST_IMAGE_WIDTHS:
+            geometry = f'{size}x{round(size * height / width)}'
+            variants[format_, size] = (geometry, options)
+    return variants
+
+
+# Все миниатюры картинки поста: (формат, ширина) -> (geometry, options).
+POST_THUMBNAILS = _thumbnail_variants()
+
+
+def _thumbnail_file(name, geometry, options):
+    """Файл миниатюры под тем же именем, что даст ``get_thumbnail``,
+    но без открытия исходника."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def _kvstore_get_many(keys):
+    """``get_many`` для KV-хранилища sorl с ``cached_db``: ключи читаются
+    из кэша одним запросом, промахи - одним запросом к базе и, как у
+    sorl, кэшируются вместе с пустыми значениями."""
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing)
+            .values_list('key', 'value'))
+        fresh = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fresh, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fresh)
+    return {
+        key: value for key, value in values.items() if value != EMPTY_VALUE
+    }
+
+
+def cached_thumbnails(image):
+    """(формат, ширина) -> готовая миниатюра или None для всех вариантов
+    картинки. Pillow и файловую систему не трогает."""
+    files = {
+        variant: _thumbnail_file(image.name, geometry, options)
+        for variant, (geometry, options) in POST_THUMBNAILS.items()
+    }
+    keys = {add_prefix(file.key): variant for variant, file in files.items()}
+    values = _kvstore_get_many(list(keys))
+    return {
+        variant: deserialize_image_file(values[key]) if key in values else None
+        for key, variant in keys.items()
+    }
+
+
+def thumbnail_names(name):
+    """Имена файлов всех миниатюр картинки ``name``."""
+    return [
+        _thumbnail_file(name, geometry, options).name
+        for geometry, options in POST_THUMBNAILS.values()
+    ]
+
+
+def _srcset(thumbnails, format_):
+    files = [
+        (size, thumbnails[format_, size])
+        for size in settings.POST_IMAGE_WIDTHS
+    ]
+    if not all(file for _, file in files):
+        return None
+    return ', '.join(f'{file.url} {size}w' for size, file in files)
+
+
+def picture(image, thumbnails=None):
+    """Миниатюры для ``<picture>`` или None, пока нет запасного JPEG.
+
+    Формат попадает в ``sources``, только когда готовы все его ширины.
+    ``thumbnails`` - уже прочитанный результат ``cached_thumbnails``.
+    """
+    if thumbnails is None:
+        thumbnails = cached_thumbnails(image)
+    width = min(
+        settings.POST_IMAGE_WIDTHS, key=lambda size: abs(size - CARD_SIZE[0]))
+    img = thumbnails[FALLBACK_FORMAT, width]
+    srcset = _srcset(thumbnails, FALLBACK_FORMAT)
+    if img is None or srcset is None:
+        return None
+    sources = []
+    for format_ in supported_formats():
+        if format_ == FALLBACK_FORMAT:
+            continue
+        format_srcset = _srcset(thumbnails, format_)
+        if format_srcset is not None:
+            sources.append(Source(MIME_TYPES[format_], format_srcset))
+    return Picture(img, srcset, sources)
+
+
+def missing_thumbnails(image, thumbnails=None):
+    if thumbnails is None:
+        thumbnails = cached_thumbnails(image)
+    return [
+        variant for variant, file in thumbnails.items() if file is None
+    ]
+
+
+def build_thumbnails(name):
+    """Строит все миниатюры картинки. Годится и для процесса пула."""
+    try:
+        for geometry, options in POST_THUMBNAILS.values():
+            get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('thumbnails failed for %s', name)
+        return False
+    return True
+
+
+def forget_cards(posts):
+    """Сбрасывает карточки, закэшированные с заглушкой вместо картинки."""
+    cache.delete_many([
+        card_key(post, variant)
+        for post in posts
+        for variant in CARD_VARIANTS
+    ])
+
+
+def forget_placeholders(built):
+    """Сбрасывает карточки и страницы, показывавшие заглушку вместо
+    построенных миниатюр. ``built`` - пары (post_id, имя картинки)."""
+    built = set(built)
+    posts = [
+        post for post in Post.objects.for_feed().filter(
+            pk__in={post_id for post_id, _ in built})
+        if (post.pk, post.image.name) in built
+    ]
+    forget_cards(posts)
+    if posts:
+        bump_generation(POSTS)
+
+
+@contextmanager
+def thumbnail_pool(workers):
+    """``map`` по пулу из ``workers`` процессов; при 0 - в этом процессе."""
+    if not workers:
+        yield map
+        return
+    # Процессы пула не должны унаследовать открытые соединения.
+    connections.close_all()
+    with ProcessPoolExecutor(workers) as pool:
+        yield pool.map
+
+
+def queue_thumbnails(post):
+    """Ставит миниатюры картинки поста в очередь ``process_thumbnails``."""
+    if post.image:
+        ThumbnailTask.objects.bulk_create(
+            [ThumbnailTask(post=post, name=post.image.name)],
+            ignore_conflicts=True,
+        )
+
+
+def claim_tasks(limit):
+    """Берёт в аренду до ``limit`` самых старых свободных задач.
+
+    Свободна задача без аренды или с истёкшей арендой. Из очереди задача
+    не удаляется: это делает ``finish_tasks`` после сборки.
+    """
+    now = timezone.now()
+    owner = uuid.uuid4().hex
+    free = Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)
+    with transaction.atomic():
+        pks = list(
+            ThumbnailTask.objects.select_for_update(skip_locked=True)
+            .filter(free).order_by('pk').values_list('pk', flat=True)[:limit]
+        )
+        # Повторная проверка аренды в UPDATE: из двух воркеров задачу
+        # получит только один.
+        ThumbnailTask.objects.filter(free, pk__in=pks).update(
+            owner=owner,
+            claimed_until=now + timedelta(
+                seconds=settings.THUMBNAIL_TASK_LEASE),
+            attempts=F('attempts') + 1,
+        )
+    return list(ThumbnailTask.objects.filter(owner=owner).order_by('pk'))
+
+
+def finish_tasks(done, failed):
+    """Удаляет собранные задачи. Несобранные остаются в очереди до конца
+    аренды, исчерпавшие попытки удаляются с ошибкой в логе."""
+    given_up = [
+        task for task in failed
+        if task.attempts >= settings.THUMBNAIL_TASK_ATTEMPTS
+    ]
+    for task in given_up:
+        logger.error(
+            'thumbnails for %s failed %s times, giving up',
+            task.name, task.attempts)
+    ThumbnailTask.objects.filter(
+        pk__in=[task.pk for task in done + given_up]).delete()
@@ -1,9 +1,318 @@
-from django.core.paginator import Paginator
+import binascii
+import heapq
+import re
+from itertools import islice
+
+from django.core.paginator import Page, Paginator
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Comment, Post
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, post):
+    raw = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Возвращает (direction, pub_date, pk) или None для битого токена."""
+    try:
+        raw = urlsafe_base64_decode(token).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+def feed_key(post):
+    return post.pub_date, post.pk
+
+
+def unique(items, key=None):
+    """Убирает соседние дубли из отсортированного потока."""
+    previous = object()
+    for item in items:
+        current = item if key is None else key(item)
+        if current != previous:
+            yield item
+        previous = current
+
+
+class CursorPage(Page):
+    """Страница, открытая по курсору: её номер не известен."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id).
+
+    Номера страниц доступны только для первых ``numbered_pages`` страниц:
+    их OFFSET и COUNT(*) ограничены сверху. Дальше лента листается
+    курсорами ``?cursor=``, каждый из которых - один индексный range scan.
+    """
+
+    date_field = 'pub_date'
+    id_field = 'pk'
+
+    def __init__(self, object_list, per_page, numbered_pages, **kwargs):
+        object_list = object_list.order_by(
+            f'-{self.date_field}', f'-{self.id_field}')
+        super().__init__(object_list, per_page, **kwargs)
+        self.numbered_pages = numbered_pages
+
+    def to_posts(self, rows):
+        return list(rows)
+
+    @cached_property
+    def _bounded_count(self):
+        limit = self.per_page * self.numbered_pages
+        return self.object_list[:limit + 1].count(), limit
+
+    @cached_property
+    def count(self):
+        count, limit = self._bounded_count
+        return min(count, limit)
+
+    @cached_property
+    def is_truncated(self):
+        count, limit = self._bounded_count
+        return count > limit
+
+    def keys(self, limit):
+        """Первые ``limit`` ключей (pub_date, id) ленты, без самих строк."""
+        return self.object_list.values_list(
+            self.date_field, self.id_field)[:limit]
+
+    def _fetch(self, direction, pub_date=None, pk=None, limit=None, offset=0):
+        """Посты после (NEXT) или до (PREVIOUS) курсора в порядке обхода."""
+        rows = self.object_list
+        if pub_date is not None:
+            date, key = self.date_field, self.id_field
+            lookup = 'lt' if direction == NEXT else 'gt'
+            rows = rows.filter(
+                Q(**{f'{date}__{lookup}': pub_date})
+                | Q(**{date: pub_date, f'{key}__{lookup}': pk})
+            )
+        if direction == PREVIOUS:
+            rows = rows.order_by(self.date_field, self.id_field)
+        return self.to_posts(rows[offset:offset + limit])
 
+    def page(self, number):
+        number = self.validate_number(number)
+        offset = (number - 1) * self.per_page
+        posts = self._fetch(NEXT, limit=self.per_page, offset=offset)
+        return self._get_page(posts, number, self)
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, settings.NUMBER_OF_POSTS)
+    def _get_page(self, object_list, number, paginator):
+        page = Page(object_list, number, paginator)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if page.object_list:
+            if number < self.num_pages or self.is_truncated:
+                page.next_cursor = encode_cursor(NEXT, page.object_list[-1])
+            if number > 1:
+                page.previous_cursor = encode_cursor(
+                    PREVIOUS, page.object_list[0])
+        return page
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token)
+        if cursor is None:
+            return self.get_page(1)
+        direction, pub_date, pk = cursor
+        posts = self._fetch(direction, pub_date, pk, self.per_page + 1)
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, True
+        else:
+            posts.reverse()
+            has_next, has_previous = True, has_more
+        if not posts:
+            return self.get_page(1)
+        return CursorPage(
+            posts,
+            self,
+            encode_cursor(NEXT, posts[-1]) if has_next else None,
+            encode_cursor(PREVIOUS, posts[0]) if has_previous else None,
+        )
+
+
+class TimelinePaginator(CursorPaginator):
+    """Листает материализованную ленту подписок ``Timeline``.
+
+    Ключ (pub_date, post_id) совпадает с ключом постов, поэтому курсоры
+    строятся по самим постам.
+    """
+
+    id_field = 'post_id'
+
+    def __init__(self, object_list, *args, **kwargs):
+        super().__init__(
+            object_list.select_related('post__author', 'post__group'),
+            *args,
+            **kwargs
+        )
+
+    def to_posts(self, rows):
+        return [entry.post for entry in rows]
+
+
+class FeedPaginator(TimelinePaginator):
+    """Гибридная лента подписок.
+
+    Посты обычных авторов уже лежат в ``Timeline`` (push), посты авторов
+    из ``pulled`` читаются при запросе по их индексам (author, pub_date)
+    и сливаются с лентой k-way merge'ем.
+    """
+
+    def __init__(self, object_list, per_page, numbered_pages, pulled=(),
+                 **kwargs):
+        super().__init__(object_list, per_page, numbered_pages, **kwargs)
+        self.pulled = [
+            CursorPaginator(
+                Post.objects.for_feed().filter(author_id=author_id),
+                per_page,
+                numbered_pages,
+            )
+            for author_id in pulled
+        ]
+
+    @cached_property
+    def _bounded_count(self):
+        if not self.pulled:
+            return super()._bounded_count
+        limit = self.per_page * self.numbered_pages
+        streams = [self.keys(limit + 1)]
+        streams.extend(source.keys(limit + 1) for source in self.pulled)
+        merged = unique(heapq.merge(*streams, reverse=True))
+        return sum(1 for _ in islice(merged, limit + 1)), limit
+
+    def _fetch(self, direction, pub_date=None, pk=None, limit=None, offset=0):
+        if not self.pulled:
+            return super()._fetch(direction, pub_date, pk, limit, offset)
+        end = offset + limit
+        streams = [super()._fetch(direction, pub_date, pk, end)]
+        streams.extend(
+            source._fetch(direction, pub_date, pk, end)
+            for source in self.pulled
+        )
+        merged = heapq.merge(
+            *streams, key=feed_key, reverse=direction == NEXT)
+        return list(islice(unique(merged, feed_key), offset, end))
+
+
+def page_window(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг ``number`` и по краям, None - пропуск.
+
+    Длина списка не больше ``2 * (on_each_side + on_ends) + 3``, сколько
+    бы ни было страниц.
+    """
+    start = max(number - on_each_side, 1)
+    end = min(number + on_each_side, num_pages)
+    pages = []
+    # Пропуск ставится, только если прячет больше одной страницы.
+    if start > on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+    else:
+        pages.extend(range(1, start))
+    pages.extend(range(start, end + 1))
+    if end < num_pages - on_ends - 1:
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(end + 1, num_pages + 1))
+    return pages
+
+
+def paginator(request, post_list, paginator_class=CursorPaginator, **kwargs):
+    paginator = paginator_class(
+        post_list,
+        settings.NUMBER_OF_POSTS,
+        settings.NUMBERED_PAGES_LIMIT,
+        **kwargs
+    )
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def encode_comment_cursor(comment):
+    return urlsafe_base64_encode(force_bytes(comment.path))
+
+
+def decode_comment_cursor(token):
+    """Возвращает путь комментария или None для битого токена."""
+    try:
+        path = urlsafe_base64_decode(token).decode()
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if not re.fullmatch(r'[0-9a-z]+', path):
+        return None
+    return path
+
+
+def comment_page(post, token=None, root=None):
+    """Порция комментариев поста в порядке веток и курсор следующей.
+
+    С ``root`` - только ветка этого комментария. Порция - один range
+    scan по индексу (post, path) с авторами в том же запросе, сколько
+    бы комментариев ни было у поста.
+    """
+    if root is not None:
+        comments = Comment.objects.subtree(root)
+    else:
+        comments = post.comments.all()
+    cursor = decode_comment_cursor(token) if token else None
+    if cursor is not None:
+        comments = comments.filter(path__gt=cursor)
+    limit = settings.NUMBER_OF_COMMENTS
+    comments = list(comments.thread()[:limit + 1])
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_comment_cursor(comments[-1])
+    return comments, next_cursor
+
+
+def pk_batches(queryset, batch_size):
+    """Списки первичных ключей ``queryset`` пачками по возрастанию pk."""
+    last_pk = None
+    while True:
+        rows = queryset.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        pks = list(rows.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
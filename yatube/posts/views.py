@@ -1,14 +1,21 @@
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Follow, Post, Group, User
-from .forms import PostForm, CommentForm
-from .utils import paginator
+from .models import Follow, Post, Group, Timeline, User
+from .forms import PostForm, CommentForm, ReplyForm
+from .utils import comment_page, paginator, FeedPaginator
+from .feed import pulled_authors, record_feed_path, PULL, PUSH
+from .caching import (
+    cache_view, conditional_view, COMMENTS, FOLLOWS, POSTS)
+from .search import search as search_posts
+from .thumbnails import queue_thumbnails
 from django.contrib.auth.decorators import login_required
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional_view(POSTS)
+@cache_view(settings.PAGE_CACHE_TIMEOUT, POSTS)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -16,11 +23,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_view(POSTS)
+@cache_view(settings.PAGE_CACHE_TIMEOUT, POSTS)
 def group_posts(request, slug):
-    group = get_object_or_404(
-        Group.objects.all().prefetch_related('posts'),
-        slug=slug)
-    post_list = group.posts.all()
+    group = get_object_or_404(Group, slug=slug)
+    post_list = group.posts.for_feed()
     page_obj = paginator(request, post_list)
     context = {
         'group': group,
@@ -29,9 +36,11 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_view(POSTS, FOLLOWS)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = author.posts.for_feed()
     page_obj = paginator(request, post_list)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -46,19 +55,53 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_view(POSTS, COMMENTS)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     form = CommentForm()
-    comment = post.comments.all()
+    comments, next_cursor = comment_page(post)
     context = {
         'post': post,
         'form': form,
-        'comments': comment
+        'comments': comments,
+        'next_cursor': next_cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_view(POSTS, COMMENTS)
+def post_comments(request, post_id, comment_id=None):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    root = None
+    if comment_id is not None:
+        root = get_object_or_404(
+            post.comments.only('post', 'path'), pk=comment_id)
+    comments, next_cursor = comment_page(
+        post, request.GET.get('cursor'), root)
+    context = {
+        'post': post,
+        'root': root,
+        'comments': comments,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = search_posts(
+        query, settings.NUMBER_OF_POSTS, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'hits': hits,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST, files=request.FILES or None)
@@ -66,6 +109,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            queue_thumbnails(post)
             return redirect('posts:profile', request.user)
         return render(request, 'posts/create_post.html', {'form': form})
     else:
@@ -87,6 +131,7 @@ def post_edit(request, post_id):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        queue_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -96,9 +141,10 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    form = CommentForm(request.POST or None)
+    form = ReplyForm(request.POST or None, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -109,8 +155,10 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, post_list)
+    pulled = pulled_authors(request.user)
+    post_list = Timeline.objects.filter(user=request.user)
+    page_obj = paginator(request, post_list, FeedPaginator, pulled=pulled)
+    record_feed_path(request, PULL if pulled else PUSH, pulled)
     context = {
         'page_obj': page_obj,
     }
@@ -118,6 +166,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
@@ -127,6 +176,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
@@ -19,6 +19,7 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +103,10 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 NUMBER_OF_POSTS = 10
+NUMBERED_PAGES_LIMIT = 10
+NUMBER_OF_COMMENTS = 20
+TIMELINE_BATCH_SIZE = 500
+TIMELINE_PUSH_LIMIT = 1000
 EMPTY_VALUE = '-пусто-'
 
 LOGIN_URL = 'users:login'
@@ -110,11 +116,51 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+FILE_UPLOAD_HANDLERS = [
+    'core.storage.HashingMemoryFileUploadHandler',
+    'core.storage.HashingTemporaryFileUploadHandler',
+]
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Поиск ранжирует только столько самых новых постов и столько же
+# комментариев: bm25 по всем совпадениям частого слова растёт с таблицей.
+SEARCH_CANDIDATES = 2500
+VIEW_CACHE_STALE_TIMEOUT = 60 * 60
+VIEW_CACHE_LOCK_TIMEOUT = 10
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+THUMBNAIL_WORKERS = 2
+# Аренда задачи очереди миниатюр в секундах и число попыток сборки.
+THUMBNAIL_TASK_LEASE = 10 * 60
+THUMBNAIL_TASK_ATTEMPTS = 3
+THUMBNAIL_BACKEND = 'posts.thumbnail_engine.ThumbnailBackend'
+THUMBNAIL_ENGINE = 'posts.thumbnail_engine.Engine'
+
+# Ширины миниатюр для srcset и параметры кодирования по форматам: от
+# лучшего сжатия к запасному JPEG (он обязателен). Форматы, которые не умеет сохранять
+# установленный Pillow (AVIF до 11.3 без плагина), пропускаются.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = {
+    'AVIF': {'quality': 50, 'speed': 6},
+    'WEBP': {'quality': 75, 'method': 4},
+    'JPEG': {'quality': 85},
+}
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Тесты пишут в кэш во временном каталоге, а не в cache.sqlite3.
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+SERVER_TIMING_SAMPLE_RATE = 0.1
+SERVER_TIMING_SLOW_MS = 500
+SERVER_TIMING_SLOW_QUERIES = 5